@@ -0,0 +1,302 @@
+import hashlib
+import re
+
+from collections import namedtuple
+
+
+# Nodes of a Boolean query: a search term (phrase = quoted) and an operator with its operands
+# (AND and OR have any number of children, NOT has exactly one)
+Term = namedtuple('Term', 'text phrase')
+Node = namedtuple('Node', 'op children')
+
+AND, OR, NOT = 'AND', 'OR', 'NOT'
+OPERATORS = (AND, OR, NOT)
+
+PROVIDERS = ('semschol', 'core', 'gs')
+
+# Google Scholar ignores everything after the first 256 characters of a query
+GS_MAX_LENGTH = 256
+
+_TOKEN_RE = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+
+
+def make_term(text):
+
+    '''
+    Create a search term; words joined by whitespace or underscores (as in WordNet lemma names) become a phrase
+    Input:  text (str)  --> word or phrase
+    Output: term (Term) --> search term
+    '''
+
+    text = ' '.join(text.replace('_', ' ').split())
+    return Term(text, ' ' in text)
+
+
+def _tokenize(query):
+
+    tokens = []
+    for m in _TOKEN_RE.finditer(query):
+        phrase, opening, closing, word = m.groups()
+        if phrase is not None:
+            tokens.append(('TERM', Term(' '.join(phrase.split()), True)))
+        elif opening:
+            tokens.append(('(', None))
+        elif closing:
+            tokens.append((')', None))
+        elif word in OPERATORS:
+            # Only upper-case operators, so that 'and', 'or' and 'not' in natural-language queries stay words
+            tokens.append((word, None))
+        elif word.startswith('-') and len(word) > 1:
+            # Google Scholar syntax: -term excludes a term
+            tokens.append((NOT, None))
+            tokens.append(('TERM', Term(word[1:], False)))
+        else:
+            tokens.append(('TERM', Term(word, False)))
+
+    return tokens
+
+
+class _Parser:
+
+    # Recursive descent parser; precedence: NOT > AND > OR, adjacent operands are AND-chained
+
+    def __init__(self, query):
+
+        self.query = query
+        # Quotes are ignored, if one of them is unmatched (all words are read as plain terms)
+        self.tokens = _tokenize(query.replace('"', ' ') if query.count('"') % 2 else query)
+        self.pos = 0
+
+    def peek(self):
+
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self):
+
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+
+        if not self.tokens:
+            return None
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError('Unexpected {!r} in query: {}'.format(self.peek(), self.query))
+        return node
+
+    def parse_or(self):
+
+        children = [self.parse_and()]
+        while self.peek() == OR:
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Node(OR, tuple(children))
+
+    def parse_and(self):
+
+        children = [self.parse_not()]
+        while self.peek() in (AND, NOT, 'TERM', '('):
+            if self.peek() == AND:
+                self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else Node(AND, tuple(children))
+
+    def parse_not(self):
+
+        if self.peek() == NOT:
+            self.take()
+            return Node(NOT, (self.parse_not(),))
+        return self.parse_atom()
+
+    def parse_atom(self):
+
+        kind = self.peek()
+        if kind == 'TERM':
+            return self.take()[1]
+        if kind == '(':
+            self.take()
+            if self.peek() == ')':
+                raise ValueError('Empty parentheses in query: {}'.format(self.query))
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise ValueError('Missing closing parenthesis in query: {}'.format(self.query))
+            self.take()
+            # Keep the group as written, so that serializing the query reproduces its parentheses
+            return node if isinstance(node, Node) else Node(AND, (node,))
+        if kind is None:
+            raise ValueError('Incomplete query: {}'.format(self.query))
+        raise ValueError('Unexpected {!r} in query: {}'.format(kind, self.query))
+
+
+def parse_query(query):
+
+    '''
+    Parse a Boolean search string (AND, OR, NOT in upper case, parentheses, quoted phrases, -term)
+    Input:  query (str)         --> search string
+    Output: node (Node/Term)    --> root of the query tree (None for an empty query)
+    '''
+
+    return _Parser(query).parse()
+
+
+def _serialize_term(t):
+
+    return '"' + t.text + '"' if t.phrase else t.text
+
+
+def to_query_string(node, provider='semschol'):
+
+    '''
+    Serialize a query tree for a search provider; AND and OR groups within other groups are always parenthesized
+    Input:  node (Node/Term)  --> root of the query tree
+            provider (str)    --> 'semschol' or 'core' (AND/OR/NOT syntax) or 'gs' (Google Scholar syntax: AND is a
+                                  space, NOT is a leading minus of a single term)
+    Output: query (str)       --> search string
+    '''
+
+    if provider not in PROVIDERS:
+        raise ValueError('Unknown provider {!r} (use one of {})'.format(provider, ', '.join(PROVIDERS)))
+    if node is None:
+        return ''
+
+    gs = provider == 'gs'
+
+    def operand(child):
+        return '(' + serialize(child) + ')' if isinstance(child, Node) and child.op != NOT else serialize(child)
+
+    def serialize(n):
+        if isinstance(n, Term):
+            return _serialize_term(n)
+        if n.op == NOT:
+            child = n.children[0]
+            if gs and isinstance(child, Node):
+                raise ValueError('Google Scholar can only exclude single terms, not groups: NOT ({})'.format(
+                                 serialize(child)))
+            child = '(' + serialize(child) + ')' if isinstance(child, Node) else serialize(child)
+            return ('-' if gs else 'NOT ') + child
+        sep = ' ' if gs and n.op == AND else ' ' + n.op + ' '
+        return sep.join(operand(c) for c in n.children)
+
+    query = serialize(node)
+    if gs and len(query) > GS_MAX_LENGTH:
+        raise ValueError('Query has {} characters, Google Scholar accepts at most {}'.format(len(query), GS_MAX_LENGTH))
+
+    return query
+
+
+def canonicalize(node):
+
+    '''
+    Canonical form of a query tree: terms in lower case, single-word phrases unquoted, nested operators of the same
+    kind flattened, single-operand groups and double negations removed, duplicate operands dropped and operands
+    sorted; equivalent queries that differ only in these respects get the same canonical form
+    Input:  node (Node/Term)  --> root of the query tree
+    Output: node (Node/Term)  --> root of the canonical query tree
+    '''
+
+    if node is None or isinstance(node, Term):
+        return node if node is None else make_term(node.text.lower())
+
+    children = [canonicalize(c) for c in node.children]
+    if node.op == NOT:
+        child = children[0]
+        return child.children[0] if isinstance(child, Node) and child.op == NOT else Node(NOT, (child,))
+
+    flat = {}
+    for c in children:
+        for cc in (c.children if isinstance(c, Node) and c.op == node.op else (c,)):
+            flat.setdefault(to_query_string(cc), cc)
+    if len(flat) == 1:
+        return next(iter(flat.values()))
+
+    return Node(node.op, tuple(flat[k] for k in sorted(flat)))
+
+
+def canonical_string(query):
+
+    '''
+    Canonical search string of a query (see canonicalize)
+    Input:  query (str/Node)  --> search string or query tree
+    Output: query (str)       --> canonical search string
+    '''
+
+    node = parse_query(query) if isinstance(query, str) else query
+    return to_query_string(canonicalize(node))
+
+
+def query_hash(query):
+
+    '''
+    Hash of the canonical form of a query (e.g. as cache key; equivalent queries get the same hash)
+    Input:  query (str/Node)  --> search string or query tree
+    Output: hash (str)        --> hex digest
+    '''
+
+    return hashlib.sha1(canonical_string(query).encode('utf-8')).hexdigest()
+
+
+def query_terms(node):
+
+    '''
+    All search terms of a query tree (in order of appearance, without duplicates)
+    Input:  node (Node/Term)  --> root of the query tree
+    Output: terms (list)      --> list with Terms
+    '''
+
+    terms = {}
+
+    def collect(n):
+        if isinstance(n, Term):
+            terms.setdefault(n, None)
+        elif n is not None:
+            for c in n.children:
+                collect(c)
+
+    collect(node)
+    return list(terms)
+
+
+def replace_term_in_string(query, text, replacement):
+
+    '''
+    Replace a search term in a search string, leaving the rest of the string as it is (e.g. implicit AND between
+    words is kept); only whole terms and phrases are replaced, case-insensitively, and a group put in place of a
+    term is parenthesized; if a quote is unmatched, all quotes are removed (parse_query ignores them as well)
+    Input:  query (str)               --> search string
+            text (str)                --> word or phrase to be replaced
+            replacement (Node/Term)   --> subtree put in place of the term
+    Output: query (str)               --> new search string
+            n_replaced (int)          --> number of replaced terms
+    '''
+
+    text = ' '.join(text.lower().split())
+    new = to_query_string(replacement)
+    if isinstance(replacement, Node):
+        new = '(' + new + ')'
+
+    if query.count('"') % 2:
+        query = query.replace('"', '')
+    parts, pos, count = [], 0, 0
+    for m in _TOKEN_RE.finditer(query):
+        phrase, _, _, word = m.groups()
+        negated = False
+        if phrase is not None:
+            matched = ' '.join(phrase.split()).lower() == text
+        elif word is not None and word not in OPERATORS:
+            if word.startswith('-') and len(word) > 1:
+                negated = True
+                word = word[1:]
+            matched = word.lower() == text
+        else:
+            matched = False
+        if matched:
+            parts.append(query[pos:m.start()])
+            # A minus only excludes single terms, so an excluded term replaced by a group becomes NOT (...)
+            parts.append(('NOT ' if isinstance(replacement, Node) else '-') + new if negated else new)
+            pos = m.end()
+            count += 1
+    parts.append(query[pos:])
+
+    return ''.join(parts), count
@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from os.path import join
+
+
+# Directory for all persistent caches (can be changed with the environment variable AI4KI_CACHE_DIR)
+CACHE_DIR = os.environ.get('AI4KI_CACHE_DIR', join(os.path.expanduser('~'), '.cache', 'ai4ki'))
+
+
+class SqliteCache:
+
+    '''
+    Persistent key-value store in a single SQLite file with time-to-live (TTL) and size-bounded eviction
+    Input:  name (str)        --> name of the cache (file name of the SQLite database without extension)
+            ttl (float)       --> default lifetime of an entry in seconds (None = entries never expire)
+            max_entries (int) --> maximum number of stored entries; least recently used entries are evicted first
+            cache_dir (str)   --> directory in which the SQLite file is stored
+    '''
+
+    def __init__(self, name, ttl=30*24*3600, max_entries=100000, cache_dir=None):
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._n_writes = 0
+        self.path = join(cache_dir or CACHE_DIR, name + '.sqlite')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                               '(key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._conn.commit()
+
+    def get(self, key, default=None):
+
+        '''
+        Return the value stored for 'key' or 'default', if the key is missing or expired
+        '''
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return default
+            self._conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=-1):
+
+        '''
+        Store a JSON-serializable 'value' under 'key'; 'ttl' overrides the default lifetime of the cache
+        '''
+
+        now = time.time()
+        ttl = self.ttl if ttl == -1 else ttl
+        expires = now + ttl if ttl is not None else None
+
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                               (key, json.dumps(value), expires, now))
+            # Counting the entries isn't free, so only check the size bound every 100 writes
+            self._n_writes += 1
+            if self._n_writes % 100 == 1:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+
+        # Drop expired entries first, then the least recently used ones until the size bound holds
+        self._conn.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?', (time.time(),))
+        n_entries = self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if self.max_entries is not None and n_entries > self.max_entries:
+            self._conn.execute('DELETE FROM cache WHERE key IN '
+                               '(SELECT key FROM cache ORDER BY accessed ASC LIMIT ?)',
+                               (n_entries - self.max_entries,))
+
+    def stats(self):
+
+        '''
+        Return the number of cache hits, misses and stored entries
+        '''
+
+        with self._lock:
+            n_entries = self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+        return {'hits': self.hits, 'misses': self.misses, 'entries': n_entries}
+
+    def clear(self):
+
+        '''
+        Delete all entries and reset the hit and miss counters
+        '''
+
+        with self._lock:
+            self._conn.execute('DELETE FROM cache')
+            self._conn.commit()
+        self.hits, self.misses = 0, 0
@@ -0,0 +1,127 @@
+from functools import lru_cache
+
+
+# Few-shot examples of texts and search strings put in front of each text
+EXAMPLE_FILE = 'qs_example_b.txt'
+DEFAULT_MODEL = 'gpt2'
+
+
+@lru_cache(maxsize=None)
+def example_prompt(path=EXAMPLE_FILE):
+
+    '''
+    Read the few-shot examples for query composition (read only once per file)
+    Input:  path (str)      --> path of the example file
+    Output: example (str)   --> examples
+    '''
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def compose_prompt(example, text):
+
+    '''
+    Few-shot prompt for composing the search string of one text
+    Input:  example (str)   --> few-shot examples
+            text (str)      --> input text
+    Output: prompt (str)    --> prompt ending with 'Search string:'
+    '''
+
+    return f"{example}\n\nText: {text}\nSearch string:"
+
+
+class QueryComposer:
+
+    '''
+    Composer of Boolean search strings with a local text-generation model: the model, the tokenizer and the
+    few-shot examples are loaded once, the examples are tokenized once, and the search strings of a batch of texts
+    are generated together (left-padded, so all prompts end at the same position)
+    Input:  model               --> name of a Hugging Face causal language model or a model object with a
+                                    generate() method (e.g. a small stub model for tests)
+            tokenizer           --> tokenizer object matching the model (None = load the tokenizer of 'model')
+            example_file (str)  --> path of the file with few-shot examples
+            device (str)        --> device to run the model on
+    '''
+
+    def __init__(self, model=DEFAULT_MODEL, tokenizer=None, example_file=EXAMPLE_FILE, device='cpu'):
+
+        import torch
+
+        if isinstance(model, str):
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+            tokenizer = tokenizer or AutoTokenizer.from_pretrained(model)
+            model = AutoModelForCausalLM.from_pretrained(model)
+            model.eval()
+        if tokenizer is None:
+            raise ValueError('A tokenizer is needed, if the model is passed as object')
+
+        self.torch = torch
+        self.device = device
+        self.model = model.to(device) if hasattr(model, 'to') else model
+        self.tokenizer = tokenizer
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+        # The few-shot part of the prompt (up to 'Text:') is the same for all texts; it's tokenized only once
+        # (GPT-2 style tokenizers split ':' from the following word, so tokenizing the parts separately gives
+        # the same tokens as tokenizing the whole prompt)
+        prompt = compose_prompt(example_prompt(example_file), '')
+        self.prefix = prompt[:prompt.rindex('Text:') + len('Text:')]
+        self.prefix_ids = list(tokenizer(self.prefix)['input_ids'])
+
+    def prompt_ids(self, text):
+
+        '''
+        Token IDs of the prompt for one text (cached few-shot prefix followed by the tokens of the text)
+        Input:  text (str)      --> input text
+        Output: ids (list)      --> token IDs
+        '''
+
+        return self.prefix_ids + list(self.tokenizer(f" {text}\nSearch string:")['input_ids'])
+
+    def compose(self, texts, maxq_length=20, temperature=0.9):
+
+        '''
+        Generate search strings for a batch of texts
+        Input:  texts (list)          --> list with input texts
+                maxq_length (int)     --> maximum number of generated tokens per search string
+                temperature (float)   --> parameter for controlling output randomness
+        Output: queries (list)        --> generated search string for each text
+        '''
+
+        torch = self.torch
+        texts = list(texts)
+        if not texts:
+            return []
+
+        # Left-pad the prompts to the same length
+        ids = [self.prompt_ids(t) for t in texts]
+        length = max(len(i) for i in ids)
+        input_ids = torch.tensor([[self.pad_id] * (length - len(i)) + i for i in ids], device=self.device)
+        attention_mask = torch.tensor([[0] * (length - len(i)) + [1] * len(i) for i in ids], device=self.device)
+
+        with torch.no_grad():
+            output = self.model.generate(input_ids=input_ids,
+                                         attention_mask=attention_mask,
+                                         max_new_tokens=maxq_length,
+                                         do_sample=True,
+                                         temperature=temperature,
+                                         top_p=1.0,
+                                         repetition_penalty=1.0,
+                                         pad_token_id=self.pad_id
+                                         )
+
+        # Only the new tokens are decoded
+        return [self.tokenizer.decode(o[length:], skip_special_tokens=True) for o in output]
+
+    def compose_one(self, text, maxq_length=20, temperature=0.9):
+
+        '''
+        Generate the search string for one text
+        Input:  text (str)            --> input text
+                maxq_length (int)     --> maximum number of generated tokens
+                temperature (float)   --> parameter for controlling output randomness
+        Output: query (str)           --> generated search string
+        '''
+
+        return self.compose([text], maxq_length=maxq_length, temperature=temperature)[0]
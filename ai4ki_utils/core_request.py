@@ -5,76 +5,137 @@ import string
 from tqdm import tqdm
 from os.path import join
 
-def core_request(url, params):
+from ai4ki_utils import http_client, search_cache
+from ai4ki_utils.download_utils import download_files
+from ai4ki_utils.page_utils import stream_pages
+
+# The search endpoint doesn't page beyond the first 10000 results of a query
+CORE_MAX_RESULTS = 10000
+
+def core_request(url, params, verbose=True):
     
     '''
-    Function for sending a GET request to the CORE API endpoint
+    Function for sending a GET request to the CORE API endpoint; results of recent identical requests are
+    served from the local search cache (see search_cache)
     Input:  url (str)        --> URL of API endpoint
             params (dir)     --> query parameters
+            verbose (bool)   --> print the number of papers found
     Output: status (boolean) --> True, if request returned results
             results (dir)    --> publication data
     '''
     
     status = False
-    results = None
+    results = search_cache.get_search('core', url, params)
 
-    r = requests.get(url, params=params)
-    
-    if r.status_code == 200:
-        results = r.json()
-        if results['totalHits'] is not None:
-            status = True
+    if results is None:
+        if search_cache.cache_only():
+            print('No cached results for this request (cache-only mode)')
+            return status, results
+
+        try:
+            r = http_client.get(url, params=params)
+        except requests.RequestException as e:
+            print('Request failed: {}'.format(e))
+            return status, results
+
+        if r.status_code == 200:
+            results = r.json()
+            if results['totalHits'] is not None:
+                search_cache.put_search('core', url, params, results)
+        elif r.status_code == 401:
+            print('Error code {code}: Invalid or no API key provided!'.format(code=r.status_code))
+            return status, results
+        elif r.status_code == 429:
+            print('Error code {code}: Too many requests in given amount of time!'.format(code=r.status_code))
+            return status, results
+        else:
+            print('Something went seriously wrong -- try restarting runtime!')
+            return status, results
+
+    if results['totalHits'] is not None:
+        status = True
+        if verbose:
             print('---------------------------------')
             print('Your query returned {total} papers'.format(total=results['totalHits']))
             print('---------------------------------')
-            if results['totalHits'] == 0:
-                print('==> Try another one!')
-    elif r.status_code == 401:
-        print('Error code {code}: Invalid or no API key provided!'.format(code=r.status_code))
-    elif r.status_code == 429:
-        print('Error code {code}: Too many requests in given amount of time!'.format(code=r.status_code))
-    else:
-        print('Something went seriously wrong -- try restarting runtime!')
+        if results['totalHits'] == 0:
+            print('==> Try another one!')
 
     return status, results
 
 
-def core_download(results, dir_path='../pdfs', n_down=100, fraction=30):
+def core_pages(url, params, max_results=None, page_size=100, info=None, first_page=None):
+    
+    '''
+    Generator for paging through the results of a CORE query; the next page is fetched in the background
+    while the current one is processed
+    Input:  url (str)         --> URL of API endpoint
+            params (dir)      --> query parameters (offset is the first result)
+            max_results (int) --> maximum number of results (None = up to the provider cap)
+            page_size (int)   --> number of results per request (at most 100)
+            info (dir)        --> if given, receives the total number of results in info['total']
+            first_page (dir)  --> raw response of an earlier request for the first page (not fetched again)
+    Output: page (list)       --> yields the publication data of one page at a time
+    '''
+
+    start = int(params.get('offset', 0))
+
+    def fetch(offset, limit):
+        if first_page is not None and offset == start:
+            return first_page.get('results', [])[:limit], first_page['totalHits']
+        page_params = dict(params, offset=str(offset), limit=str(limit))
+        status, results = core_request(url, page_params, verbose=offset == start)
+        if not status:
+            return None, 0
+        return results.get('results'), results['totalHits']
+
+    return stream_pages(fetch, start, max_results, page_size, CORE_MAX_RESULTS, info)
+
+
+def core_stream(url, params, max_results=None, page_size=100):
     
     '''
-    Function for downloading PDFs from the CORE Collection
-    Input:  results (dir)  --> list of dictionaries with formatted publication data
-            dir_path (str) --> path to download directory
-            n_down (int)   --> number of PDFs to download
-            fraction (int) --> fraction of characters from publication title for PDF filename
+    Generator yielding the publication records of a CORE query one by one (see core_pages)
+    '''
+
+    for page in core_pages(url, params, max_results, page_size):
+        yield from page
+
+
+def core_download(results, dir_path='../pdfs', n_down=100, fraction=30, max_workers=8):
+    
+    '''
+    Function for downloading PDFs from the CORE Collection; files that are already complete are skipped,
+    interrupted downloads are resumed and the outcomes are written to a manifest in 'dir_path'
+    Input:  results (dir)     --> list of dictionaries with formatted publication data
+            dir_path (str)    --> path to download directory
+            n_down (int)      --> number of PDFs to download
+            fraction (int)    --> fraction of characters from publication title for PDF filename
+            max_workers (int) --> number of concurrent downloads
     Output: None
     '''
     
     assert n_down <= len(results), 'Number of requested downloads larger than number of stored publications!'
 
     fail_count = 0
+    jobs = []
 
     print('Downloading {} PDFs'.format(n_down))
 
-    for i in tqdm(range(n_down)):
+    for i in range(n_down):
         pdf_link = results[i]['CORE PDF link']
 
         if pdf_link is not None:
             title = results[i]['Title']
             title_frac = title[:fraction].translate(str.maketrans('', '', string.punctuation)).replace(' ', '_')
             filename = 'CORE_' + title_frac + '.pdf'
-            file_path = join(dir_path, filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-            r = requests.get(pdf_link)
-            if r.status_code == 200:
-                with open(file_path, 'wb') as f:
-                    f.write(r.content)
-            else:
-                fail_count += 1
+            jobs.append((pdf_link, filename))
         else:
             fail_count += 1
 
+    outcomes = download_files(jobs, dir_path, max_workers=max_workers)
+    fail_count += sum(1 for o in outcomes if o['status'] == 'failed')
+
     if fail_count != 0:
         print('{} PDFs could not be downloaded!'.format(fail_count))
 
@@ -0,0 +1,176 @@
+import threading
+
+from ai4ki_utils.cache_utils import SqliteCache
+from ai4ki_utils import http_client
+from ai4ki_utils.enrich_utils import MAX_WORKERS, enrich_concurrent
+
+
+CROSSREF_URL = "http://api.crossref.org/"
+
+# Cached BibTeX entries expire after 90 days; the cache holds at most 200000 entries
+BIB_CACHE_TTL = 90*24*3600
+BIB_CACHE_SIZE = 200000
+
+_bib_cache = None
+_bib_cache_lock = threading.Lock()
+
+
+def bib_cache():
+
+    '''
+    Return the persistent DOI-to-BibTeX cache shared by all formatting functions (created on first use)
+    Output: cache (SqliteCache) --> BibTeX cache
+    '''
+
+    global _bib_cache
+    with _bib_cache_lock:
+        if _bib_cache is None:
+            _bib_cache = SqliteCache('bibtex', ttl=BIB_CACHE_TTL, max_entries=BIB_CACHE_SIZE)
+
+    return _bib_cache
+
+
+def bib_cache_stats():
+
+    '''
+    Return the hit and miss counts of the BibTeX cache
+    Output: stats (dict) --> number of cache hits, misses and stored entries
+    '''
+
+    return bib_cache().stats()
+
+
+def print_bib_cache_stats(before=None):
+
+    '''
+    Print the hit and miss counts of the BibTeX cache
+    Input:  before (dict) --> stats from an earlier call of bib_cache_stats(); if given, only the difference is printed
+    '''
+
+    stats = bib_cache_stats()
+    hits, misses = stats['hits'], stats['misses']
+    if before is not None:
+        hits -= before['hits']
+        misses -= before['misses']
+    print('==> BibTeX cache: {h} hits, {m} misses'.format(h=hits, m=misses))
+
+
+def doi2bib(doi, use_cache=True):
+
+    '''
+    Function for converting DOI to BibTex with the Crossref REST API; results are kept in a persistent local cache
+    Crossref REST API documentation: https://www.crossref.org/documentation/retrieve-metadata/rest-api/
+    Input:  doi (str)         --> publication Digital Object Identifier
+            use_cache (bool)  --> look up and store the BibTex entry in the local cache
+    Output: bibtex (str)      --> publication metadata in BibTex-format
+    '''
+
+    # DOIs are case-insensitive, so normalize them for the cache key
+    key = doi.strip().lower()
+    if use_cache:
+        bibtex = bib_cache().get(key)
+        if bibtex is not None:
+            return bibtex
+
+    bibtex = None
+
+    url = "{}works/{}/transform/application/x-bibtex"
+    url = url.format(CROSSREF_URL, doi)
+    r = http_client.get(url)
+
+    if r.status_code == 200:
+        bibtex = r.content
+        bibtex = str(bibtex, "utf-8")
+        if use_cache:
+            bib_cache().set(key, bibtex)
+
+    return bibtex
+
+
+def lookup_doi(title, author):
+
+    '''
+    Function for looking up the DOI of a publication from its title and author(s) with the Crossref REST API;
+    the HTTP status is returned as well, so callers can tell "no match" from a failed request
+    Crossref REST API documentation: https://www.crossref.org/documentation/retrieve-metadata/rest-api/
+    Input:  title (str)    --> publication title
+            author (str)   --> publication's author(s)
+    Output: status (int)   --> HTTP status code of the request
+            doi (str)      --> publication Digital Object Identifier (None, if there is no match)
+    '''
+
+    title = title.replace(' ', '%20')
+    author = author.replace(' ', '%20')
+    doi = None
+
+    url = "{}works?query.bibliographic={},{}&rows=1"
+    url = url.format(CROSSREF_URL, title, author)
+    r = http_client.get(url)
+
+    if r.status_code == 200:
+        items = r.json()['message']['items']
+        if items:
+            doi = items[0]['DOI']
+
+    return r.status_code, doi
+
+
+def get_doi(title, author):
+
+    '''
+    Function for getting DOI from publication title and author(s) with the Crossref REST API
+    Input:  title (str)  --> publication title
+            author (str) --> publication's author(s)
+    Output: doi (str)    --> publication Digital Object Identifier
+    '''
+
+    return lookup_doi(title, author)[1]
+
+
+def get_doi_bib(title, author):
+
+    '''
+    Function for getting DOI and BibTex of a publication from its title and author(s) with the Crossref REST API
+    Input:  title (str)   --> publication title
+            author (str)  --> publication's author(s)
+    Output: doi (str)     --> publication Digital Object Identifier
+            bibtex (str)  --> publication metadata in BibTex-format
+    '''
+
+    doi = get_doi(title, author)
+    bibtex = doi2bib(doi) if doi is not None else None
+
+    return doi, bibtex
+
+
+def doi2bib_batch(dois, max_workers=MAX_WORKERS):
+
+    '''
+    Resolve BibTex entries for a list of DOIs concurrently
+    Input:  dois (list)        --> list of DOIs (None entries are skipped)
+            max_workers (int)  --> number of concurrent workers
+    Output: bibtex (list)      --> BibTex entries in the order of 'dois'
+    '''
+
+    idx = [i for i, doi in enumerate(dois) if doi is not None]
+    resolved = enrich_concurrent(doi2bib, [(dois[i],) for i in idx], max_workers=max_workers, desc='BibTex')
+
+    bibtex = [None] * len(dois)
+    for i, bib in zip(idx, resolved):
+        bibtex[i] = bib
+
+    return bibtex
+
+
+def get_doi_bib_batch(pubs, max_workers=MAX_WORKERS):
+
+    '''
+    Resolve DOI and BibTex entries for a list of publications concurrently
+    Input:  pubs (list)        --> list of (title, author) tuples
+            max_workers (int)  --> number of concurrent workers
+    Output: doi_bib (list)     --> (doi, bibtex) tuples in the order of 'pubs'
+    '''
+
+    resolved = enrich_concurrent(get_doi_bib, pubs, max_workers=max_workers, desc='DOI/BibTex')
+
+    return [r if r is not None else (None, None) for r in resolved]
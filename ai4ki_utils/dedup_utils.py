@@ -0,0 +1,278 @@
+import numpy as np
+import re
+import unicodedata
+
+from collections import defaultdict
+
+
+# MinHash/LSH settings: 16 bands of 4 rows find title pairs with a shingle similarity of ~0.5 and above with
+# high probability; the candidate pairs are then verified with the exact Jaccard similarity
+NUM_PERM = 64
+NUM_BANDS = 16
+SHINGLE_SIZE = 3
+MAX_BUCKET = 50
+SUBTITLE_MIN_WORDS = 3
+
+# Multiply-shift hash functions (the products are meant to wrap around modulo 2**64)
+_rng = np.random.RandomState(42)
+_HASH_A = _rng.randint(1, 2**62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+_HASH_B = _rng.randint(0, 2**62, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_BAND_MIX = _rng.randint(1, 2**62, size=NUM_PERM, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+
+# ASCII titles are normalized with a translation table, other titles character by character
+_APOSTROPHES = "'‘’`´"
+_ASCII_TABLE = {ord(c): ' ' for c in map(chr, range(128)) if not c.isalnum()}
+_ASCII_TABLE.update({ord("'"): None, ord('`'): None})
+
+_DOI_PREFIX = re.compile(r'^(https?://(dx\.)?doi\.org/|doi:)', re.IGNORECASE)
+_TAGS = re.compile(r'<[^>]+>')
+_SUBTITLE = re.compile(r'\s*(?::|\s[-‐-―]\s)\s*')
+
+
+def normalize_title(title):
+
+    '''
+    Normalize a publication title for matching: unicode compatibility forms and accents are folded, markup is
+    removed, apostrophes join words, other punctuation (including dashes) separates words, and the result is
+    lowercased with single spaces
+    Input:  title (str) --> publication title
+    Output: norm (str)  --> normalized title
+    '''
+
+    if not title:
+        return ''
+    text = _TAGS.sub(' ', title)
+    if text.isascii():
+        return ' '.join(text.translate(_ASCII_TABLE).lower().split())
+
+    chars = []
+    for c in unicodedata.normalize('NFKD', text):
+        cat = unicodedata.category(c)
+        if cat == 'Mn' or c in _APOSTROPHES:
+            continue
+        chars.append(' ' if cat[0] in 'PSZC' else c)
+
+    return ' '.join(''.join(chars).lower().split())
+
+
+def main_title(title):
+
+    '''
+    Return the normalized main title (the part before a subtitle separated by ':' or a spaced dash)
+    Input:  title (str) --> publication title
+    Output: main (str)  --> normalized main title ('' if the title has no subtitle or the main title is too short)
+    '''
+
+    if not title:
+        return ''
+    parts = _SUBTITLE.split(title, maxsplit=1)
+    if len(parts) < 2:
+        return ''
+    main = normalize_title(parts[0])
+
+    return main if len(main.split()) >= SUBTITLE_MIN_WORDS else ''
+
+
+def normalize_doi(doi):
+
+    '''
+    Normalize a DOI (strip resolver prefixes and lowercase)
+    Input:  doi (str)  --> DOI or DOI link
+    Output: norm (str) --> bare, lowercased DOI ('' if no DOI is given)
+    '''
+
+    if not isinstance(doi, str):
+        return ''
+
+    return _DOI_PREFIX.sub('', doi.strip()).lower()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+
+    '''
+    Character shingles of a (normalized) text
+    Input:  text (str)      --> normalized text
+            size (int)      --> shingle length
+    Output: shingles (set)  --> set of character n-grams
+    '''
+
+    if len(text) <= size:
+        return {text}
+
+    return {text[i:i+size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signatures(texts, size=SHINGLE_SIZE, chunk_size=5000):
+
+    '''
+    MinHash signatures of the character shingles of a list of texts (shingles are hashed from the code points of the
+    texts, so no shingle sets have to be built)
+    Input:  texts (list)          --> list of non-empty, normalized texts
+            size (int)            --> shingle length
+            chunk_size (int)      --> number of texts hashed at once (bounds the memory use)
+    Output: signatures (ndarray)  --> array of shape (len(texts), NUM_PERM)
+    '''
+
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    for start in range(0, len(texts), chunk_size):
+        # Short texts are padded, so that each text has at least one shingle
+        chunk = [t.ljust(size, '\0') for t in texts[start:start+chunk_size]]
+        points = np.frombuffer(''.join(chunk).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        lengths = np.array([len(t) for t in chunk])
+        n_shingles = lengths - size + 1
+
+        # Positions at which a shingle starts within its text
+        title_end = np.repeat(np.cumsum(lengths), lengths)
+        pos = np.arange(len(points))
+        pos = pos[pos + size <= title_end]
+
+        values = np.zeros(len(pos), dtype=np.uint64)
+        for j in range(size):
+            values = (values << np.uint64(21)) | points[pos + j]
+        offsets = np.concatenate(([0], np.cumsum(n_shingles)[:-1]))
+        # One hash function at a time, so that only one hash value per shingle is held in memory
+        for k in range(NUM_PERM):
+            hashes = (_HASH_A[k] * values + _HASH_B[k]) >> np.uint64(32)
+            signatures[start:start+len(chunk), k] = np.minimum.reduceat(hashes, offsets)
+
+    return signatures
+
+
+def lsh_candidates(signatures, n_bands=NUM_BANDS, max_bucket=MAX_BUCKET):
+
+    '''
+    Candidate pairs of a MinHash LSH index: two items are candidates, if their signatures agree in at least one band
+    Input:  signatures (ndarray) --> MinHash signatures (see minhash_signatures)
+            n_bands (int)        --> number of bands
+            max_bucket (int)     --> buckets with more items are skipped (they only contain very generic titles)
+    Output: pairs (set)          --> set of index pairs (i, j) with i < j
+    '''
+
+    rows = signatures.shape[1] // n_bands
+    pairs = set()
+    for b in range(n_bands):
+        # Hash each band to one bucket key and find the runs of equal keys
+        keys = (signatures[:, b*rows:(b+1)*rows] * _BAND_MIX[:rows]).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(keys[order])) + 1))
+        sizes = np.diff(np.append(starts, len(keys)))
+        for start, n in zip(starts[sizes > 1], sizes[sizes > 1]):
+            if n <= max_bucket:
+                bucket = order[start:start+n].tolist()
+                for x in range(len(bucket)):
+                    for y in range(x + 1, len(bucket)):
+                        pairs.add((bucket[x], bucket[y]))
+
+    return pairs
+
+
+class _Clusters:
+
+    # Union-find over publication records; two clusters are never merged, if they contain records from the same
+    # data file (duplicates within one file are kept) or if they have different DOIs
+
+    def __init__(self, records):
+
+        self.parent = list(range(len(records)))
+        self.files = [{f} for f, _, _ in records]
+        self.dois = [{d} if d else set() for _, _, d in records]
+
+    def find(self, i):
+
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return True
+        if self.files[i] & self.files[j]:
+            return False
+        if self.dois[i] and self.dois[j] and self.dois[i] != self.dois[j]:
+            return False
+        if len(self.files[i]) < len(self.files[j]):
+            i, j = j, i
+        self.parent[j] = i
+        self.files[i] |= self.files[j]
+        self.dois[i] |= self.dois[j]
+        return True
+
+    def join(self, groups):
+
+        # Merge the members of each group into as few clusters as possible
+        for members in groups:
+            roots = []
+            for m in members:
+                if not any(self.union(r, m) for r in roots):
+                    roots.append(m)
+
+
+def dedup_records(pub_data, fuzzy=True, threshold=0.8):
+
+    '''
+    Group the publication records of several data files into clusters of duplicates
+    Records are matched (1) on their DOI, (2) on their normalized title, (3) on a main title that equals the full
+    title of another record (i.e. the titles differ by a subtitle) and (4), if fuzzy, on near-duplicate titles
+    found with a MinHash/LSH index over character shingles (so no all-pairs comparison is needed)
+    Input:  pub_data (list)     --> list of lists with publication data from different queries
+            fuzzy (bool)        --> also match near-duplicate titles (typos, small wording differences)
+            threshold (float)   --> minimum Jaccard similarity of the title shingles of near-duplicates
+    Output: clusters (list)     --> list of lists with the cluster id of each publication record
+            titles (dict)       --> normalized title of the first record of each cluster, keyed by cluster id
+    '''
+
+    records = []
+    for k, pubs in enumerate(pub_data):
+        for idx, item in enumerate(pubs):
+            records.append((k, idx, normalize_doi(item.get('DOI'))))
+    norm = [normalize_title(pub_data[k][idx].get('Title')) for k, idx, _ in records]
+    clusters = _Clusters(records)
+
+    # (1) DOI
+    by_doi = defaultdict(list)
+    for r, (_, _, doi) in enumerate(records):
+        if doi:
+            by_doi[doi].append(r)
+    clusters.join(by_doi.values())
+
+    # (2) Normalized title
+    by_title = defaultdict(list)
+    for r, title in enumerate(norm):
+        if title:
+            by_title[title].append(r)
+    clusters.join(by_title.values())
+
+    # (3) Main title without subtitle
+    for r, (k, idx, _) in enumerate(records):
+        main = main_title(pub_data[k][idx].get('Title'))
+        if main in by_title:
+            clusters.join([[m, r] for m in by_title[main]])
+
+    # (4) Near-duplicate titles
+    if fuzzy and len(by_title) > 1:
+        unique = list(by_title)
+        shingle_sets = {}
+        for i, j in lsh_candidates(minhash_signatures(unique)):
+            for n in (i, j):
+                if n not in shingle_sets:
+                    shingle_sets[n] = shingles(unique[n])
+            a, b = shingle_sets[i], shingle_sets[j]
+            if len(a & b) >= threshold * len(a | b):
+                for m in by_title[unique[i]]:
+                    for n in by_title[unique[j]]:
+                        clusters.union(m, n)
+
+    # Label the clusters in the order of their first record
+    labels, titles = {}, {}
+    ids = [[None] * len(pubs) for pubs in pub_data]
+    for r, (k, idx, _) in enumerate(records):
+        root = clusters.find(r)
+        if root not in labels:
+            labels[root] = len(labels)
+            titles[labels[root]] = norm[r]
+        ids[k][idx] = labels[root]
+
+    return ids, titles
@@ -3,25 +3,83 @@ import numpy as np
 
 def rbo(list1, list2, p=0.9):
     # Compare the ranking of the lists using Rank Biased Overlap (RBO)
-    # The following code was taken from https://towardsdatascience.com/rbo-v-s-kendall-tau-to-compare-ranked-lists-of-items-8776c5182899
-    # Define the RBO function:
-
-    def helper(ret, i, d):
-        l1 = set(list1[:i]) if i < len(list1) else set(list1)
-        l2 = set(list2[:i]) if i < len(list2) else set(list2)
-        a_d = len(l1.intersection(l2))/i
-        term = math.pow(p, i) * a_d
-        if d == i:
-            return ret + term
-        return helper(ret + term, i + 1, d)
+    # The following code was adapted from https://towardsdatascience.com/rbo-v-s-kendall-tau-to-compare-ranked-lists-of-items-8776c5182899
+    # The overlap of the prefixes is updated incrementally at each depth (O(k) instead of O(k^2), no recursion)
 
     k = max(len(list1), len(list2))
-    x_k = len(set(list1).intersection(set(list2)))
-    summation = helper(0, 1, k)
+    if k == 0:
+        return 0.0
+
+    seen1, seen2 = set(), set()
+    overlap = 0
+    summation = 0.0
+    for i in range(1, k + 1):
+        if i <= len(list1) and list1[i-1] not in seen1:
+            seen1.add(list1[i-1])
+            overlap += list1[i-1] in seen2
+        if i <= len(list2) and list2[i-1] not in seen2:
+            seen2.add(list2[i-1])
+            overlap += list2[i-1] in seen1
+        summation += math.pow(p, i) * overlap / i
+
+    # After the last depth, the overlap equals the overlap of the full lists
+    x_k = overlap
 
     return ((float(x_k)/k) * math.pow(p, k)) + ((1-p)/p * summation)
 
 
+def rbo_matrix(lists, p=0.9, truncate=True):
+    # Compute RBO and overlap for all pairs of ranked lists at once
+    # Input variables: lists (list) --> list of Q ranked lists (e.g. paper ids returned by Q queries)
+    #                  p (float) --> RBO persistence parameter
+    #                  truncate (bool) --> compare each pair only up to the length of the shorter list
+    # Output variables: rbo_mat (array) --> Q x Q matrix with the RBO of each pair
+    #                   overlap_mat (array) --> Q x Q matrix with the number of items shared by each pair
+
+    n_lists = len(lists)
+
+    # Map items to integers and store the depth (1-based) at which each item first appears in each list
+    vocab = {}
+    ids, depths = [], []
+    for lst in lists:
+        first = {}
+        for d, item in enumerate(lst, 1):
+            if item not in first:
+                first[item] = d
+        ids.append(np.array([vocab.setdefault(item, len(vocab)) for item in first], dtype=np.int64))
+        depths.append(np.array(list(first.values()), dtype=np.int64))
+
+    no_depth = np.iinfo(np.int64).max
+    positions = np.full((n_lists, len(vocab)), no_depth, dtype=np.int64)
+    for q in range(n_lists):
+        positions[q, ids[q]] = depths[q]
+
+    max_len = max([len(lst) for lst in lists], default=0)
+    weights = np.power(p, np.arange(1, max_len + 1)) / np.arange(1, max_len + 1)
+
+    rbo_mat = np.eye(n_lists)
+    overlap_mat = np.zeros((n_lists, n_lists), dtype=np.int64)
+    for a in range(n_lists):
+        overlap_mat[a, a] = len(ids[a])
+        for b in range(a + 1, n_lists):
+            depth_b = positions[b, ids[a]]
+            overlap_mat[a, b] = overlap_mat[b, a] = np.count_nonzero(depth_b != no_depth)
+
+            k = min(len(lists[a]), len(lists[b])) if truncate else max(len(lists[a]), len(lists[b]))
+            if k == 0:
+                rbo_mat[a, b] = rbo_mat[b, a] = 0.0
+                continue
+
+            # An item shared by both prefixes counts from the depth at which it has appeared in both lists
+            shared = np.maximum(depths[a], depth_b)
+            shared = shared[shared <= k]
+            overlap = np.cumsum(np.bincount(shared, minlength=k + 1)[1:])
+            summation = np.dot(weights[:k], overlap)
+            rbo_mat[a, b] = rbo_mat[b, a] = (overlap[-1]/k) * math.pow(p, k) + (1-p)/p * summation
+
+    return rbo_mat, overlap_mat
+
+
 def sum_series(p=0.9, d=10):
 
     def helper(ret, p, d, i):
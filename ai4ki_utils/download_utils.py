@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import requests
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from os.path import exists, getsize, join
+from tqdm import tqdm
+
+from ai4ki_utils import http_client
+
+
+MANIFEST_FILE = 'download_manifest.json'
+CHUNK_SIZE = 64*1024
+PART_XTNSN = '.part'
+
+# Files are requested without content encoding, so that sizes and byte ranges refer to the stored bytes
+DOWNLOAD_HEADERS = {'Accept-Encoding': 'identity'}
+
+
+def file_hash(path):
+
+    '''
+    Calculate the SHA-256 hash of a file
+    Input:  path (str)   --> path to file
+    Output: digest (str) --> hex digest of the file content
+    '''
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def load_manifest(dir_path):
+
+    '''
+    Load the download manifest of a directory
+    Input:  dir_path (str)   --> path to download directory
+    Output: manifest (dict)  --> outcome of earlier downloads, keyed by file name
+    '''
+
+    path = join(dir_path, MANIFEST_FILE)
+    if not exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(dir_path, manifest):
+
+    '''
+    Write the download manifest of a directory (atomically, via a temporary file)
+    Input:  dir_path (str)  --> path to download directory
+            manifest (dict) --> outcome of the downloads, keyed by file name
+    '''
+
+    path = join(dir_path, MANIFEST_FILE)
+    with open(path + PART_XTNSN, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + PART_XTNSN, path)
+
+
+def _content_range(header):
+
+    # Parse a Content-Range header ('bytes start-end/total' or 'bytes */total'); unknown values are None
+    m = re.fullmatch(r'\s*bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)\s*', header or '')
+    if m is None:
+        return None
+
+    return tuple(int(v) if v is not None and v != '*' else None for v in m.groups())
+
+
+def _encoded(r):
+
+    # The body of an encoded (e.g. gzip) response is decoded while streaming, so its size differs from the
+    # Content-Length and its byte ranges don't match the stored bytes
+    return r.headers.get('Content-Encoding', 'identity').strip().lower() not in ('', 'identity')
+
+
+def download_file(url, file_path, record=None, verify_hash=False):
+
+    '''
+    Download a file in chunks to a temporary file and rename it, once it's complete; partial downloads are
+    resumed with an HTTP Range request and files that are already complete are skipped
+    Input:  url (str)           --> download link
+            file_path (str)     --> path of the downloaded file
+            record (dict)       --> manifest entry of an earlier download of the file (if any)
+            verify_hash (bool)  --> only skip existing files, if their SHA-256 hash matches the manifest entry
+    Output: outcome (dict)      --> url, status ('downloaded', 'skipped' or 'failed'), size, hash and error message
+    '''
+
+    outcome = {'url': url, 'status': 'failed', 'size': None, 'sha256': None, 'error': None}
+    part_path = file_path + PART_XTNSN
+
+    try:
+        # Skip files that are already complete
+        if exists(file_path):
+            size = getsize(file_path)
+            if record is not None and record.get('size') == size and record.get('status') != 'failed':
+                if not verify_hash or record.get('sha256') == file_hash(file_path):
+                    outcome.update(status='skipped', size=size, sha256=record.get('sha256'))
+                    return outcome
+            elif record is None:
+                # Without a manifest entry, compare the file size with the size announced by the server
+                r = http_client.get(url, headers=DOWNLOAD_HEADERS, stream=True)
+                length = r.headers.get('Content-Length')
+                r.close()
+                if (r.status_code == 200 and not _encoded(r) and length is not None and length.isdigit()
+                        and int(length) == size):
+                    outcome.update(status='skipped', size=size)
+                    return outcome
+
+        # Resume a partial download, if there is one
+        offset = getsize(part_path) if exists(part_path) else 0
+        headers = dict(DOWNLOAD_HEADERS, Range='bytes={}-'.format(offset)) if offset else DOWNLOAD_HEADERS
+        r = http_client.get(url, headers=headers, stream=True)
+        content_range = _content_range(r.headers.get('Content-Range'))
+
+        restart = False
+        if offset and r.status_code == 416:
+            r.close()
+            if content_range is not None and content_range[2] == offset:
+                # The server reports exactly the size of the partial file as total size, so it's complete
+                r = None
+            else:
+                restart = True
+        elif r.status_code == 206 and (content_range is None or content_range[0] != offset or _encoded(r)):
+            # The server sent another (or an encoded) range than requested; appending it would corrupt the file
+            r.close()
+            restart = True
+
+        if restart:
+            # Download the whole file again
+            r = http_client.get(url, headers=DOWNLOAD_HEADERS, stream=True)
+            if r.status_code == 206:
+                r.close()
+                outcome['error'] = 'Unexpected partial content'
+                return outcome
+
+        if r is not None:
+            if r.status_code not in (200, 206):
+                r.close()
+                outcome['error'] = 'Error code {}'.format(r.status_code)
+                return outcome
+
+            # Expected size of the complete file (None, if the server doesn't tell or encodes the content)
+            encoded = _encoded(r)
+            if r.status_code == 206:
+                total = content_range[2]
+            elif encoded:
+                total = None
+            else:
+                length = r.headers.get('Content-Length')
+                total = int(length) if length is not None and length.isdigit() else None
+
+            sha = hashlib.sha256()
+            if r.status_code == 206:
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        sha.update(chunk)
+                mode = 'ab'
+            else:
+                mode = 'wb'
+            try:
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        sha.update(chunk)
+            except (requests.RequestException, OSError):
+                # A partial decoded file can't be resumed with a byte range, so it's discarded
+                if encoded and exists(part_path):
+                    os.remove(part_path)
+                raise
+            finally:
+                r.close()
+
+            # A truncated transfer is kept as partial file and resumed next time
+            if total is not None and getsize(part_path) != total:
+                outcome['error'] = 'Incomplete download ({} of {} bytes)'.format(getsize(part_path), total)
+                return outcome
+            outcome['sha256'] = sha.hexdigest()
+
+        os.replace(part_path, file_path)
+        if outcome['sha256'] is None:
+            outcome['sha256'] = file_hash(file_path)
+        outcome.update(status='downloaded', size=getsize(file_path))
+    except (requests.RequestException, OSError, ValueError) as e:
+        outcome['error'] = str(e)
+
+    return outcome
+
+
+def download_files(jobs, dir_path, max_workers=8, verify_hash=False, desc='PDFs'):
+
+    '''
+    Download files concurrently and record the outcome of each download in a manifest in 'dir_path'
+    Input:  jobs (list)         --> list of (url, file name) tuples; files are stored in 'dir_path'
+            dir_path (str)      --> path to download directory
+            max_workers (int)   --> number of concurrent downloads
+            verify_hash (bool)  --> only skip existing files, if their SHA-256 hash matches the manifest entry
+            desc (str)          --> description for the progress bar
+    Output: outcomes (list)     --> outcome dict for each job (see download_file)
+    '''
+
+    os.makedirs(dir_path, exist_ok=True)
+    manifest = load_manifest(dir_path)
+    lock = threading.Lock()
+
+    # Two jobs writing to the same file would corrupt it, so only the first one is kept
+    seen = set()
+    outcomes = [None] * len(jobs)
+    todo = []
+    for i, (url, file_name) in enumerate(jobs):
+        if file_name in seen:
+            outcomes[i] = {'url': url, 'status': 'failed', 'size': None, 'sha256': None,
+                           'error': 'Duplicate file name'}
+        else:
+            seen.add(file_name)
+            todo.append(i)
+
+    def work(i):
+        url, file_name = jobs[i]
+        outcome = download_file(url, join(dir_path, file_name), manifest.get(file_name), verify_hash)
+        outcomes[i] = outcome
+        # The manifest is saved after each download, so an interrupted run keeps its records
+        with lock:
+            manifest[file_name] = outcome
+            save_manifest(dir_path, manifest)
+
+    if todo:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(todo))) as pool:
+            list(tqdm(pool.map(work, todo), total=len(todo), desc=desc))
+
+    n_down = sum(1 for o in outcomes if o['status'] == 'downloaded')
+    n_skip = sum(1 for o in outcomes if o['status'] == 'skipped')
+    print('==> Downloaded {d} files, skipped {s} existing files, {f} downloads failed'.format(
+          d=n_down, s=n_skip, f=len(outcomes) - n_down - n_skip))
+    print('==> Outcomes written to {}'.format(join(dir_path, MANIFEST_FILE)))
+
+    return outcomes
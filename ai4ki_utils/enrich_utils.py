@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+
+# Default size of the worker pool (the number of requests per host is bounded in http_client)
+MAX_WORKERS = 16
+
+
+def enrich_concurrent(func, args_list, max_workers=MAX_WORKERS, desc=None):
+
+    '''
+    Call 'func' for every argument tuple in 'args_list' with a bounded thread pool
+    Input:  func (callable)    --> function doing the (network bound) work for one item
+            args_list (list)   --> list of argument tuples, one per item
+            max_workers (int)  --> size of the thread pool
+            desc (str)         --> description for the progress bar
+    Output: results (list)     --> return values in the order of 'args_list' (None, if the call failed)
+    '''
+
+    results = [None] * len(args_list)
+    if not args_list:
+        return results
+
+    def work(i):
+        try:
+            results[i] = func(*args_list[i])
+        except Exception as e:
+            print('Failed to enrich item {}: {}'.format(i, e))
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(args_list))) as pool:
+        list(tqdm(pool.map(work, range(len(args_list))), total=len(args_list), desc=desc))
+
+    return results
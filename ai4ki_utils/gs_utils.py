@@ -1,8 +1,52 @@
 # Helper functions for ai4ki literature review project
 
-import requests
+import json
+
 from tqdm import tqdm
 from scholarly import scholarly
+
+from ai4ki_utils import search_cache
+from ai4ki_utils.crossref_utils import bib_cache_stats, doi2bib, get_doi, print_bib_cache_stats
+from ai4ki_utils.pub_record import PubRecord
+
+
+# Google Scholar has no API endpoint; searches are cached under this pseudo-URL
+GS_URL = 'https://scholar.google.com/scholar'
+
+
+def gs_search(query, max_pubs=100, year_low=None, year_high=None):
+    
+    '''
+    Function for fetching the results of a Google Scholar search with scholarly; results of recent identical
+    searches are served from the local search cache (see search_cache)
+    Input:  query (str)      --> search string
+            max_pubs (int)   --> maximum number of publications to fetch
+            year_low (int)   --> first publication year (None = no limit)
+            year_high (int)  --> last publication year (None = no limit)
+    Output: results (list)   --> list with the publication data returned by scholarly (as plain JSON data)
+    '''
+    
+    params = {'q': query, 'as_ylo': year_low, 'as_yhi': year_high, 'max_pubs': max_pubs}
+    results = search_cache.get_search('gs', GS_URL, params)
+    if results is not None:
+        print('Loaded {} publications from the search cache'.format(len(results)))
+        return results
+    if search_cache.cache_only():
+        print('No cached results for this search (cache-only mode)')
+        return []
+
+    results = []
+    search_query = scholarly.search_pubs(query, year_low=year_low, year_high=year_high)
+    for pub in tqdm(search_query, total=max_pubs):
+        results.append(pub)
+        if len(results) == max_pubs: break
+
+    # Publications contain non-JSON types (e.g. the source enum), so they are converted to plain JSON; the
+    # converted results are returned as well, so callers get the same data with and without the cache
+    results = json.loads(json.dumps(results, default=str))
+    search_cache.put_search('gs', GS_URL, params, results)
+
+    return results
   
     
 def format_gs_data(pub_counter, results):
@@ -15,7 +59,8 @@ def format_gs_data(pub_counter, results):
     '''
     
     output_list = []
-    entries_dict = {}
+    entries_dict = PubRecord()
+    cache_stats = bib_cache_stats()
 
     for i in tqdm(range(pub_counter)):
 
@@ -55,56 +100,8 @@ def format_gs_data(pub_counter, results):
             entries_dict['URL'] = None
 
         output_list.append(entries_dict)
-        entries_dict = {}
-
-    return output_list
-
-
-def doi2bib(doi):
-    
-    '''
-    Function for converting DOI to BibTex with the Crossref REST API
-    Crossref REST API documentation: https://www.crossref.org/documentation/retrieve-metadata/rest-api/
-    Input:  DOI (str)     --> publication Digital Object Identifier
-    Output: bibtex (str) --> publication metadata in BibTex-format
-    '''
-
-    CROSSREF_URL = "http://api.crossref.org/"
-    bibtex = None
-
-    url = "{}works/{}/transform/application/x-bibtex"
-    url = url.format(CROSSREF_URL, doi)
-    r = requests.get(url)
+        entries_dict = PubRecord()
 
-    if r.status_code == 200:
-        bibtex = r.content
-        bibtex = str(bibtex, "utf-8")
+    print_bib_cache_stats(before=cache_stats)
 
-    return bibtex
-
-
-def get_doi(title, author):
-    
-    '''
-    Function for getting DOI from publication title and author(s) with the Crossref REST API
-    Crossref REST API documentation: https://www.crossref.org/documentation/retrieve-metadata/rest-api/
-    Input:  title (str)  --> publication title
-            author (str) --> publication's author(s)
-    Output: doi (str)    --> publication Digital Object Identifier
-    '''
-    
-    CROSSREF_URL = "http://api.crossref.org/"
-
-    title = title.replace(' ', '%20')
-    author = author.replace(' ', '%20')
-    doi = None
-
-    url = "{}works?query.bibliographic={},{}&rows=1"
-    url = url.format(CROSSREF_URL, title, author)
-    r = requests.get(url)
-
-    if r.status_code == 200:
-        data = r.json()
-        doi = data['message']['items'][0]['DOI']
-
-    return doi
\ No newline at end of file
+    return output_list
@@ -0,0 +1,203 @@
+import email.utils
+import random
+import requests
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+
+
+# Request timeouts in seconds: (connect, read)
+TIMEOUT = (10, 60)
+
+# Retry settings: status codes worth retrying, maximum number of retries and backoff parameters in seconds
+RETRY_STATUS = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 120.0
+
+# Default number of concurrent requests (and pooled keep-alive connections) per host
+HOST_LIMIT = 8
+
+# Token bucket settings per API: (requests per second, burst size)
+RATE_LIMITS = {
+    'semschol': (1.0, 1),
+    'core': (10/60, 10),
+    'crossref': (10.0, 10),
+    'unpaywall': (10.0, 10),
+}
+
+# Hosts of the rate-limited APIs
+API_HOSTS = {
+    'api.semanticscholar.org': 'semschol',
+    'api.core.ac.uk': 'core',
+    'api.crossref.org': 'crossref',
+    'api.unpaywall.org': 'unpaywall',
+}
+
+HEADERS = {'User-Agent': 'ai4ki-literature-search/1.0 (mailto:ai4ki.dev@gmail.com)'}
+
+_host_limits = {}
+_host_slots = {}
+_sessions = {}
+_buckets = {}
+_lock = threading.Lock()
+
+
+class TokenBucket:
+
+    '''
+    Thread-safe token bucket for limiting the request rate to an API
+    Input:  rate (float) --> number of tokens added per second
+            burst (int)  --> maximum number of tokens in the bucket
+    '''
+
+    def __init__(self, rate, burst):
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+
+        '''
+        Take one token from the bucket; blocks until a token is available
+        '''
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def set_rate_limit(api, rate, burst=1):
+
+    '''
+    Set the token bucket parameters for an API
+    Input:  api (str)    --> one of 'semschol', 'core', 'crossref', 'unpaywall'
+            rate (float) --> requests per second
+            burst (int)  --> maximum number of requests sent in a burst
+    '''
+
+    with _lock:
+        RATE_LIMITS[api] = (rate, burst)
+        _buckets.pop(api, None)
+
+
+def set_host_limit(host, limit):
+
+    '''
+    Set the maximum number of concurrent requests to a host
+    Input:  host (str)   --> host name, e.g. 'api.crossref.org'
+            limit (int)  --> maximum number of requests in flight
+    '''
+
+    with _lock:
+        _host_limits[host] = limit
+        _host_slots.pop(host, None)
+        _sessions.pop(host, None)
+
+
+def host_slot(url):
+
+    '''
+    Return the semaphore that bounds the number of concurrent requests to the host of 'url'
+    Input:  url (str)                   --> request URL
+    Output: slot (threading.Semaphore)  --> semaphore for the URL's host
+    '''
+
+    host = urlparse(url).netloc
+    with _lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(_host_limits.get(host, HOST_LIMIT))
+        return _host_slots[host]
+
+
+def _session(host):
+
+    # One session per host, so that keep-alive connections are pooled and reused across threads
+    with _lock:
+        if host not in _sessions:
+            pool_size = _host_limits.get(host, HOST_LIMIT)
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
+
+def _bucket(host):
+
+    api = API_HOSTS.get(host)
+    if api is None:
+        return None
+    with _lock:
+        if api not in _buckets:
+            _buckets[api] = TokenBucket(*RATE_LIMITS[api])
+        return _buckets[api]
+
+
+def _retry_wait(r, attempt):
+
+    # Honour the server's Retry-After header (seconds or HTTP date), otherwise back off exponentially with jitter
+    if r is not None and r.headers.get('Retry-After'):
+        retry_after = r.headers['Retry-After']
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            try:
+                wait = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                wait = BACKOFF_BASE * 2**attempt
+        return min(max(wait, 0.0), BACKOFF_MAX)
+
+    return min(BACKOFF_BASE * 2**attempt * (1 + random.random()), BACKOFF_MAX)
+
+
+def get(url, params=None, headers=None, stream=False, timeout=TIMEOUT, retries=MAX_RETRIES):
+
+    '''
+    Send a GET request through the pooled session of the URL's host with rate limiting, timeouts and retries
+    Input:  url (str)                   --> request URL
+            params (dict)               --> query parameters
+            headers (dict)              --> additional request headers
+            stream (bool)               --> don't download the response body immediately
+            timeout (tuple)             --> (connect, read) timeout in seconds
+            retries (int)               --> maximum number of retries for failed or throttled requests
+    Output: r (requests.Response)       --> response of the last attempt
+    Raises requests.RequestException, if the request still fails with a network error after all retries
+    '''
+
+    host = urlparse(url).netloc
+    session = _session(host)
+    bucket = _bucket(host)
+
+    attempt = 0
+    while True:
+        if bucket is not None:
+            bucket.acquire()
+        r = None
+        try:
+            with host_slot(url):
+                r = session.get(url, params=params, headers=headers, stream=stream, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt >= retries:
+                raise
+        else:
+            if r.status_code not in RETRY_STATUS or attempt >= retries:
+                return r
+            r.close()
+
+        time.sleep(_retry_wait(r, attempt))
+        attempt += 1
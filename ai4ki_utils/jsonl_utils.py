@@ -0,0 +1,85 @@
+import json
+
+from ai4ki_utils.pub_record import PubRecord
+
+
+JSN_XTNSN, JSNL_XTNSN = '.json', '.jsonl'
+
+
+class JsonlWriter:
+
+    '''
+    Writer for line-delimited JSON files (one publication record per line); records are written and flushed as soon
+    as they are passed to write(), so a file always holds all records formatted so far
+    Input:  path (str)   --> path of the JSONL file
+            mode (str)   --> 'w' to create a new file, 'a' to append to an existing one
+    '''
+
+    def __init__(self, path, mode='w'):
+
+        self.path = path
+        self.n_records = 0
+        self._f = open(path, mode, encoding='utf-8')
+
+    def write(self, records):
+
+        '''
+        Write a list of records
+        '''
+
+        for record in records:
+            if isinstance(record, PubRecord):
+                record = record.to_dict()
+            self._f.write(json.dumps(record, ensure_ascii=False))
+            self._f.write('\n')
+        self._f.flush()
+        self.n_records += len(records)
+
+    def close(self):
+
+        self._f.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+
+def write_jsonl(records, path, mode='w'):
+
+    '''
+    Write publication records to a JSONL file
+    Input:  records (list) --> list with publication data
+            path (str)     --> path of the JSONL file
+            mode (str)     --> 'w' to create a new file, 'a' to append to an existing one
+    Output: None
+    '''
+
+    with JsonlWriter(path, mode) as writer:
+        writer.write(records)
+
+
+def iter_records(path, columns=None):
+
+    '''
+    Generator for reading publication records from a JSONL file (line by line) or a JSON file with a list of records
+    (the format of older result files, which is read at once)
+    Input:  path (str)      --> path of the JSONL or JSON file
+            columns (list)  --> fields to keep of each record (None = all fields)
+    Output: record (dict)   --> yields one publication record at a time (as plain dict)
+    '''
+
+    def project(record):
+        return record if columns is None else {c: record.get(c) for c in columns}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(JSNL_XTNSN):
+            for line in f:
+                if line.strip():
+                    yield project(json.loads(line))
+        else:
+            for record in json.load(f):
+                yield project(record)
@@ -0,0 +1,126 @@
+import numpy as np
+import re
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def _stemmer():
+
+    # NLTK is only needed for the (optional) stemming mode
+    from nltk.stem import PorterStemmer
+
+    return PorterStemmer()
+
+
+@lru_cache(maxsize=100000)
+def _stem(token):
+
+    return _stemmer().stem(token)
+
+
+def trie_pattern(keywords):
+
+    '''
+    Build a regular expression from a prefix tree of the keywords, so that the regex engine only follows branches
+    that match the text (the longest keyword is tried first at each position)
+    Input:  keywords (iterable) --> keywords (matched literally)
+    Output: pattern (str)       --> regex body without anchors or word boundaries ('' for no keywords)
+    '''
+
+    trie = {}
+    for k in keywords:
+        node = trie
+        for char in k:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def pattern(node):
+        end = '' in node
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not end:
+            return branches[0]
+        alternation = '(?:' + '|'.join(branches) + ')'
+        return alternation + '?' if end else alternation
+
+    return pattern(trie)
+
+
+class KeywordMatcher:
+
+    '''
+    Matcher that finds all keywords of a keyword list in a text in a single regex pass
+    Input:  keywords (list)       --> list of keywords (matching is case-insensitive)
+            word_boundary (bool)  --> only match whole words/phrases (True) or any substring (False)
+            stem (bool)           --> match stemmed words, e.g. 'farming' matches 'farms' (implies word_boundary)
+    '''
+
+    def __init__(self, keywords, word_boundary=False, stem=False):
+
+        self.stem = stem
+        self.word_boundary = word_boundary or stem
+        self.n_keywords = len(keywords)
+
+        terms = [self._normalize(k) for k in keywords]
+
+        # Empty keywords match every text; duplicate keywords count as often as they appear in the list
+        self.n_empty = sum(1 for t in terms if not t)
+        self.weights = {}
+        for t in terms:
+            if t:
+                self.weights[t] = self.weights.get(t, 0) + 1
+
+        # Keywords that match at the same position as a longer keyword are prefixes of that keyword
+        self.prefixes = {}
+        for k in self.weights:
+            self.prefixes[k] = [p for p in self.weights if k.startswith(p) and self._ends_at(k, len(p))]
+
+        body = trie_pattern(self.weights)
+        if not body:
+            self.regex = None
+        elif self.word_boundary:
+            self.regex = re.compile(r'(?<!\w)(?=(' + body + r')(?!\w))')
+        else:
+            self.regex = re.compile(r'(?=(' + body + r'))')
+
+    def _normalize(self, text):
+
+        text = text.lower()
+        if self.stem:
+            text = ' '.join(_stem(t) for t in re.findall(r'\w+', text))
+        return text
+
+    def _ends_at(self, k, i):
+
+        return i == len(k) or not self.word_boundary or not re.match(r'\w', k[i])
+
+    def count(self, text):
+
+        '''
+        Count the keywords appearing in a text
+        Input:  text (str)  --> text to be scanned (None counts as empty text)
+        Output: count (int) --> number of keywords that appear in the text
+        '''
+
+        if self.regex is None or not text:
+            return self.n_empty
+
+        found = set()
+        for m in self.regex.finditer(self._normalize(text)):
+            found.update(self.prefixes[m.group(1)])
+
+        return self.n_empty + sum(self.weights[k] for k in found)
+
+    def scores(self, texts):
+
+        '''
+        Calculate the fraction of keywords appearing in each text
+        Input:  texts (list)      --> list of texts (None entries count as empty texts)
+        Output: scores (ndarray)  --> match score (0 <= score <= 1) for each text
+        '''
+
+        counts = np.fromiter((self.count(t) for t in texts), dtype=float, count=len(texts))
+
+        return counts / self.n_keywords if self.n_keywords else counts
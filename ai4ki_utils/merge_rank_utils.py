@@ -2,7 +2,12 @@ import os
 import json
 import string
 
-from itertools import combinations
+from ai4ki_utils.dedup_utils import dedup_records
+from ai4ki_utils.jsonl_utils import JSN_XTNSN, JSNL_XTNSN, iter_records
+from ai4ki_utils.keyword_matcher import KeywordMatcher
+from ai4ki_utils.pub_record import PubRecord, as_records
+from ai4ki_utils.result_store import STORE_NAME, load_pub_data
+from collections.abc import Mapping
 from os import listdir
 from os.path import isfile, join
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -10,26 +15,59 @@ from sklearn.metrics.pairwise import cosine_similarity
 
 
 
-def get_pub_data(path='./results'):
+def iter_pub_data(path='./results', columns=None):
 
     '''
-    Fetches publication data from all JSON-files in directory 'path'
-    Input: path (str)       --> path to directory with JSON-files
-    Output: pub_data (list) --> list with publication data from each JSON-file
+    Generator for streaming publication data from all JSONL- and JSON-files in directory 'path'; JSONL-files are
+    read line by line, so only one record at a time has to be held in memory
+    Input:  path (str)      --> path to directory with JSONL/JSON-files
+            columns (list)  --> fields to keep of each record (None = all fields)
+    Output: file_name (str) --> yields the name of the data file ...
+            records (iter)  --> ... and a generator over its publication records
+    '''
+
+    for file_name in _data_files(path):
+        yield file_name, iter_records(join(path, file_name), columns)
+
+
+def _data_files(path):
+
+    return sorted(f for f in listdir(path) if isfile(join(path, f)) and f.endswith((JSN_XTNSN, JSNL_XTNSN)))
+
+
+def get_pub_data(path='./results', store=False, runs=None, columns=None, filter=None):
+
+    '''
+    Fetches publication data from all JSONL- and JSON-files in directory 'path' or from the result store in 'path'
+    Input: path (str)       --> path to directory with JSONL/JSON-files
+           store (bool)     --> load the query runs from the result store in 'path' (see result_store) instead
+           runs (list)      --> (store only) query run IDs to load (None = all runs)
+           columns (list)   --> publication fields to load (None = all fields)
+           filter           --> (store only) pyarrow.dataset expression, e.g. ds.field('Year') >= 2015
+    Output: pub_data (list) --> list with publication data (PubRecords) from each data file (or query run)
     '''
     
-    file_names = [f for f in listdir(path) if isfile(join(path, f)) and f[-4:] == 'json']
-    n_files = len(file_names)
-    print('Found {} files in directory {}:'.format(n_files, path))
+    if store:
+        store_path = path if path.rstrip('/').endswith(STORE_NAME) else join(path, STORE_NAME)
+        pub_data, run_ids = load_pub_data(store_path, runs, columns, filter)
+        as_records(pub_data)
+        print('Found {} query runs in store {}:'.format(len(run_ids), store_path))
+        print('========================================')
+        for i in range(len(run_ids)):
+            print('Query run {}: {} ({})'.format(i, run_ids[i], pub_data[i][0].get('query')))
+            print('\tRun lists {} publications'.format(len(pub_data[i])))
+            print('----------------------------------------')
+        return pub_data
+
+    print('Found {} files in directory {}:'.format(len(_data_files(path)), path))
     print('========================================')
 
     pub_data = []
-    for i in range(n_files):
-        with open(os.path.join(path, file_names[i]), 'r', encoding='utf-8') as f:
-            file_data = list(json.load(f))
-            print('Data file {}: {}'.format(i, file_names[i]))
-            print('\tFile lists {} publications'.format(len(file_data)))
-            print('----------------------------------------')
+    for i, (file_name, records) in enumerate(iter_pub_data(path, columns)):
+        file_data = [PubRecord.from_dict(record) for record in records]
+        print('Data file {}: {}'.format(i, file_name))
+        print('\tFile lists {} publications'.format(len(file_data)))
+        print('----------------------------------------')
         pub_data.append(file_data)
 
     return pub_data
@@ -76,50 +114,70 @@ def rank_score(pub_list, norm, key='Rank score'):
     print('==> Normalized rank scores calculated and added to publication data')
     
    
-def match_score(pub_list, keywords):
+def match_score(pub_list, keywords, word_boundary=False, stem=False):
     
     '''
     Calculates the title and abstract match scores
     Input:  pub_list (list)       --> list with publication data from different queries
             keywords (list)       --> list of keywords to match in title or abstract        
-    Output: pub_list (list)       --> list with rs-expanded publication data from different queries
+            word_boundary (bool)  --> only match whole words/phrases instead of any substring
+            stem (bool)           --> match stemmed words (e.g. 'farming' matches 'farms')
+    Output: title_scores (array)    --> title match scores of all publications (in the order of pub_list)
+            abstract_scores (array) --> abstract match scores of all publications (in the order of pub_list)
     '''
     
-    n_keywords = len(keywords)
-    n_files = len(pub_list)
+    # Build the matcher once per keyword list; it scans each text in a single pass
+    matcher = KeywordMatcher(keywords, word_boundary=word_boundary, stem=stem)
+    items = [item for file_data in as_records(pub_list) for item in file_data]
 
-    for i in range(n_files):
-             
-        for j, item in enumerate(pub_list[i]):
-            title_score = 0
-            abstract_score = 0
-            title = ''
-            abstract = ''
-            
-            if item['Title'] is not None: 
-                title = item['Title'].lower()
-            if item['Abstract'] is not None:
-                abstract = item['Abstract'].lower()
-            
-            for k in keywords:
-                title_score += k in title
-                abstract_score += k in abstract
-                
-            item['Title match score'] = title_score / n_keywords
-            item['Abstract match score'] = abstract_score / n_keywords
+    title_scores = matcher.scores([item.title for item in items])
+    abstract_scores = matcher.scores([item.abstract for item in items])
+
+    for item, title_score, abstract_score in zip(items, title_scores, abstract_scores):
+        item.title_match_score = float(title_score)
+        item.abstract_match_score = float(abstract_score)
 
     print('==> Title and abstract match scores calculated and added to publication data')
+
+    return title_scores, abstract_scores
     
 
-def sim_score(pub_list, document):
+def sim_score(pub_list, document, batched=True):
     
     '''
     Calculates the similarity score between a dcoument and a publication's abstract using the tf-idf-algorithm
     Input:  pub_list (list) --> list of lists with publication data from different queries
             document (str)  --> document to be compared against a publications's abstract
+            batched (bool)  --> fit one tf-idf model on all abstracts plus the document (True) or
+                                one model per abstract on the pair [document, abstract] (False)
     Output: pub_list (list) --> input data with similarity score added for each publications
     '''
     
+    if batched:
+        # Collect all abstracts, so that the idf-weights are calculated on the whole corpus
+        items = [item for file_data in as_records(pub_list) for item in file_data]
+        abstracts = [item.abstract.lower() for item in items if item.abstract is not None]
+
+        if abstracts:
+            vectorizer = TfidfVectorizer()
+            embeddings = vectorizer.fit_transform([document] + abstracts)
+
+            # Rows are l2-normalized, so the cosine similarity is a single sparse matrix-vector product
+            scores = (embeddings[1:] @ embeddings[0].T).toarray().ravel()
+        else:
+            scores = []
+
+        j = 0
+        for item in items:
+            if item.abstract is not None:
+                item.similarity_score = float(scores[j])
+                j += 1
+            else:
+                item.similarity_score = 0.0
+
+        print('==> Similarity scores calculated and added to publication data')
+        return
+
     vectorizer = TfidfVectorizer()
     n_files = len(pub_list)
     
@@ -138,44 +196,135 @@ def sim_score(pub_list, document):
     print('==> Similarity scores calculated and added to publication data')
     
     
-def get_proc_titles(pub_data):
+def get_proc_titles(pub_data, fuzzy=True, threshold=0.8):
     
     '''
     Retrieve publication titles from publication data and process them for matching
+    Duplicates across data files are identified by DOI, normalized title, main title (without subtitle) and,
+    if fuzzy, near-duplicate titles (see dedup_utils.dedup_records); each group of duplicates gets one key
     Input:  pub_data (list)        --> list of lists with publication data from different queries
-    Output: pub_data_titles (list) --> list of sets with processed publication titles
+            fuzzy (bool)           --> also match near-duplicate titles (e.g. typos)
+            threshold (float)      --> minimum similarity of near-duplicate titles (0 < threshold <= 1)
+    Output: pub_data_titles (list) --> list of sets with processed publication titles (one key per group of duplicates)
             pub_data_idx (list)    --> list of directories, which link processed titles to data file
     '''
     
     n_files = len(pub_data)
 
+    print('==> Processing titles...')
+    cluster_ids, cluster_titles = dedup_records(pub_data, fuzzy=fuzzy, threshold=threshold)
+
+    # Give each group of duplicates a unique key, i.e. its normalized title (numbered, if several groups share
+    # a title, e.g. articles of a collection that appear with the same title in one data file)
+    keys = {}
+    n_title = {}
+    for c, title in cluster_titles.items():
+        n_title[title] = n_title.get(title, 0) + 1
+        keys[c] = title if n_title[title] == 1 else '{} #{}'.format(title, n_title[title])
+
     pub_data_titles = []
     pub_data_idx = []
-
-    print('==> Processing titles...')
     for k in range(n_files):
-        pub_titles = []
-        title2idx = {}
-        for idx, item in enumerate(pub_data[k]):
-            # Remove punctuation from title and lowercase as notation might not be consistent across databases
-            title = item['Title'].translate(str.maketrans('', '', string.punctuation)).lower()
+        # A group contains at most one record of each data file, so no record is overwritten here
+        title2idx = {keys[c]: idx for idx, c in enumerate(cluster_ids[k])}
+        pub_data_titles.append(set(title2idx))
+        pub_data_idx.append(title2idx)
+
+    n_pubs = sum(len(pubs) for pubs in pub_data)
+    print('Found {} duplicates among {} publications'.format(n_pubs - len(keys), n_pubs))
+
+    return pub_data_titles, pub_data_idx
+
+
+class MatchIndex(Mapping):
 
-            # For each title, store the index of the item for identification later
-            title2idx[title] = idx
-            pub_titles.append(title)
+    '''
+    Inverted index from processed titles to the data files containing them; behaves like a read-only directory
+    with the following structure:
+        key (tuple)   --> sorted tuple of two or more data files (e.g. (0, 2, 3))
+        value (list)  --> list of titles appearing in exactly these data files (and no other)
+    Only file combinations in which titles occur are keys (e.g. a title found in files 0, 2 and 3 yields the key
+    (0, 2, 3), but not (0, 2)), so the index scales with the number of titles instead of with 2^n_files; titles
+    appearing in at least some data files are returned by at_least().
+    Input:  pub_data_titles (list) --> list of sets with processed publication titles
+    '''
+
+    def __init__(self, pub_data_titles):
+
+        self.n_files = len(pub_data_titles)
+
+        # Single pass over all titles: title --> set of files containing it
+        title_files = {}
+        for k, titles in enumerate(pub_data_titles):
+            for title in titles:
+                title_files.setdefault(title, []).append(k)
+        self.title_files = {title: frozenset(files) for title, files in title_files.items()}
+
+        # Exact file-set of each title: file-set --> titles appearing in exactly these files
+        self.file_sets = {}
+        for title, files in self.title_files.items():
+            self.file_sets.setdefault(files, []).append(title)
+
+        self._combinations = None
+
+    def exact(self, files):
 
-        # For each data file, store publication titles as sets for easy duplicate identification below
         '''
-        NOTE: There's a problem, when a title appears multiple times in one data file with different authors
-        (e.g. because it's a collection of articles where each individual article doesn't have its own title).
-        With the following code, we only keep one of the corresponding articles (the one which is last on the list).
-        Since we currently see no other option than to use the title as a unquie article id, we have to accpet 
-        this for now (and hope that such cases don't occur too often... ;).
-        ''' 
-        pub_data_titles.append(set(pub_titles))
-        pub_data_idx.append(title2idx)
+        Return the titles that appear in exactly the data files 'files' (and no other)
+        '''
 
-    return pub_data_titles, pub_data_idx
+        return list(self.file_sets.get(frozenset(files), []))
+
+    def at_least(self, files):
+
+        '''
+        Return the titles that appear in all data files 'files' (and possibly others)
+        '''
+
+        files = frozenset(files)
+        return [title for file_set, titles in self.file_sets.items() if files <= file_set for title in titles]
+
+    def count(self, files, exact=False):
+
+        '''
+        Return the number of titles appearing in (exactly, if exact=True) the data files 'files'
+        '''
+
+        files = frozenset(files)
+        if exact:
+            return len(self.file_sets.get(files, []))
+        return sum(len(titles) for file_set, titles in self.file_sets.items() if files <= file_set)
+
+    def _file_set(self, key):
+
+        # Exact file-set of a key; keys must name two or more different data files
+        try:
+            files = frozenset(key)
+        except TypeError:
+            raise KeyError(key)
+        if len(files) < 2 or not all(isinstance(k, int) and 0 <= k < self.n_files for k in files):
+            raise KeyError(key)
+        return files
+
+    def __getitem__(self, key):
+
+        files = self._file_set(key)
+        if files not in self.file_sets:
+            raise KeyError(key)
+        return list(self.file_sets[files])
+
+    def __iter__(self):
+
+        # Only the exact file-sets are visited (their number is bounded by the number of titles)
+        if self._combinations is None:
+            self._combinations = sorted((tuple(sorted(fs)) for fs in self.file_sets if len(fs) > 1),
+                                        key=lambda c: (len(c), c))
+
+        return iter(self._combinations)
+
+    def __len__(self):
+
+        return sum(1 for fs in self.file_sets if len(fs) > 1)
 
 
 def find_matches(pub_data_titles, n_files):
@@ -184,39 +333,36 @@ def find_matches(pub_data_titles, n_files):
     Find matches of papers for all possible combinations of publication data files
     Input:  pub_data_titles (list) --> list of sets with processed publication titles
             n_files (int)          --> number of publication lists/queries (=len(pub_data_titles))
-    Output: pub_data_matches (dir) --> directory with the following structure:
+    Output: pub_data_matches (MatchIndex) --> directory-like index with the following structure:
                key (tuple)             --> tuples indicating the queries which have matches
-               value (list):           --> list of matching titles
+               value (list):           --> list of titles matching in exactly these queries
     '''
     
-    pub_data_matches = {}
-    # Things get tricky only, if there are more than two data files:
     print('==> Finding matches...')
-    if n_files > 2:
-        max_tup = n_files
-        for nt in range(2, max_tup + 1):
-            # Get all tuples of length nt <= n_files
-            n_tuples = list(combinations(range(max_tup), nt))
-
-            # Loop of all tuples of length nt
-            for tuples in n_tuples:
-                # Create list with the nt data files in tuples
-                sub_set = [pub_data_titles[t] for t in tuples]
-                # Find the matching titles in the nt data files
-                match = list(set.intersection(*sub_set))
-                pub_data_matches[tuples] = match
-                print('\tFound {n:03d} matching papers in data files {tp}'.format(n=len(match), tp=tuples))
-                sub_set, match = [], {}
-
-    elif n_files == 2:
-        pub_data_matches[(0, 1)] = list(set.intersection(*pub_data_titles))
-        print('\tFound {} matching papers in the two files.'.format(len(pub_data_matches[(0, 1)])))
+    pub_data_matches = MatchIndex(pub_data_titles)
+
+    if n_files >= 2:
+        # Report the number of papers per exact combination of data files (only non-empty combinations)
+        for file_set in sorted(pub_data_matches.file_sets, key=lambda fs: (len(fs), sorted(fs))):
+            if len(file_set) > 1:
+                print('\tFound {n:03d} papers in exactly the data files {tp}'.format(
+                      n=len(pub_data_matches.file_sets[file_set]), tp=tuple(sorted(file_set))))
     else:
         print('\tERROR: No enough files for matching--got {}, need 2 or more!'.format(n_files))
 
     return pub_data_matches
 
 
+def _to_int(value):
+
+    # Care for non-int entries (e.g. for year or citations) in publication data...
+    if type(value) == str:
+        return int(value) if value.isdigit() else -1
+    elif type(value) == int:
+        return value
+    return -1
+
+
 def merge_pub_data(pub_data, pub_data_titles, pub_data_idx, pub_data_matches={}, use_find_matches=False):
     
     '''
@@ -224,79 +370,39 @@ def merge_pub_data(pub_data, pub_data_titles, pub_data_idx, pub_data_matches={},
     Input:  pub_data (list)             --> list of lists with publication data from different queries
             pub_data_titles (list)      --> list of sets with processed publication titles
             pub_data_idx (list)         --> list of directories, which link processed titles to data file
-            pub_data_matches (dir)      --> directory with match-title-info
-            use_find_matches (bool)     --> switch for using/not using output of function find_matches
-    Output: pub_data_merge_final (list) --> list with directories for each selected publication
+            pub_data_matches (dir)      --> directory with match-title-info (kept for compatibility; the occurrence
+                                            count is now taken from the title index directly)
+            use_find_matches (bool)     --> add the number of data files in which each publication occurs
+    Output: pub_data_merge_final (list) --> list with a PubRecord for each selected publication
     '''
     
     n_files = len(pub_data)
 
     print('==> Merging publication data...')
-    # Remove duplicates and merge lists
-    pub_data_merge = list(set.union(*pub_data_titles))
-    print('Number of unique papers: ', len(pub_data_merge))
-
+    # Build the index title --> [(file, idx), ...] in a single pass over all data files
+    title_index = {}
+    for file in range(n_files):
+        for title, idx in pub_data_idx[file].items():
+            title_index.setdefault(title, []).append((file, idx))
+    print('Number of unique papers: ', len(title_index))
+
+    as_records(pub_data)
     pub_data_merge_final = []
-    for title in pub_data_merge:
-        idx = -1
-        found = (-1, -1)
-        sum_rs = 0.0
-        n_rs = 0
-        entries_dict = {}
-        occ_count = 1
-
-        for file in range(n_files):
-            try:
-                idx = pub_data_idx[file][title]
-                sum_rs += pub_data[file][idx]['Rank score']
-                n_rs += 1
-                found = (file, idx)
-            except:
-                pass
-
-        if use_find_matches:
-            for key, values in pub_data_matches.items():
-                if title in values:
-                    occ_count = len(key)
-
-        entries_dict['Title'] = pub_data[found[0]][found[1]]['Title']
-        entries_dict['Authors'] = pub_data[found[0]][found[1]]['Authors']
-        entries_dict['Abstract'] = pub_data[found[0]][found[1]]['Abstract']
-        entries_dict['BibTex'] = pub_data[found[0]][found[1]]['BibTex']
-
-        # Care for non-int entries for year in publication data...
-        year = pub_data[found[0]][found[1]]['Year']
-        if type(year) == str:
-            if year.isdigit():
-                entries_dict['Year'] = int(year)
-            else:
-                entries_dict['Year'] = -1
-        elif type(year) == int:
-            entries_dict['Year'] = year
-        else:
-            entries_dict['Year'] = -1
+    for title, occurrences in title_index.items():
 
-        # Care for non-int entries for citations in publication data...
-        cites = pub_data[found[0]][found[1]]['Citations']
-        if type(cites) == str:
-            if cites.isdigit():
-                entries_dict['Citations'] = int(cites)
-            else:
-                entries_dict['Citations'] = -1
-        elif type(cites) == int:
-            entries_dict['Citations'] = cites
-        else:
-            entries_dict['Citations'] = -1
+        # Take the representative fields from the last data file containing the publication
+        pub = pub_data[occurrences[-1][0]][occurrences[-1][1]]
 
-        entries_dict['Rank score'] = sum_rs / n_rs
-        entries_dict['Title match score'] = pub_data[found[0]][found[1]]['Title match score']
-        entries_dict['Abstract match score'] = pub_data[found[0]][found[1]]['Abstract match score']
-        entries_dict['Similarity score'] = pub_data[found[0]][found[1]]['Similarity score']
+        merged = PubRecord(title=pub.title, authors=pub.authors, abstract=pub.abstract, bibtex=pub.bibtex,
+                           year=_to_int(pub.year), citations=_to_int(pub.citations),
+                           rank_score=sum(pub_data[file][idx].rank_score for file, idx in occurrences) / len(occurrences),
+                           title_match_score=pub.title_match_score, abstract_match_score=pub.abstract_match_score,
+                           similarity_score=pub.similarity_score)
         
         if use_find_matches:
-            entries_dict['Occurrence count'] = occ_count
+            merged.occurrence_count = len(occurrences)
 
-        pub_data_merge_final.append(entries_dict)
+        pub_data_merge_final.append(merged)
 
     return pub_data_merge_final
 
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def stream_pages(fetch, offset=0, max_results=None, page_size=100, max_offset=None, info=None):
+
+    '''
+    Generator that pages through the results of a search API and prefetches the next page in the background
+    Input:  fetch (callable)   --> fetch(offset, limit) returns (items, total) for one page; items is None on failure
+            offset (int)       --> offset of the first result
+            max_results (int)  --> maximum number of results to fetch (None = all results up to max_offset)
+            page_size (int)    --> number of results per request
+            max_offset (int)   --> provider cap, i.e. the largest offset + limit the API accepts
+            info (dict)        --> if given, the total number of results reported by the API is stored in info['total']
+    Output: page (list)        --> yields the items of one page at a time
+    '''
+
+    end = offset + max_results if max_results is not None else None
+    if max_offset is not None:
+        end = min(end, max_offset) if end is not None else max_offset
+
+    def limit_at(o):
+        return min(page_size, end - o) if end is not None else page_size
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(fetch, offset, limit_at(offset)) if limit_at(offset) > 0 else None
+        try:
+            while future is not None:
+                limit = limit_at(offset)
+                items, total = future.result()
+                future = None
+                if info is not None and 'total' not in info:
+                    info['total'] = total
+                if not items:
+                    break
+
+                # Request the next page before handing the current one to the caller
+                offset += len(items)
+                if len(items) == limit and (total is None or offset < total) and limit_at(offset) > 0:
+                    future = pool.submit(fetch, offset, limit_at(offset))
+
+                yield items
+        finally:
+            if future is not None:
+                future.cancel()
+
+
+def reusable_page(page, params, ignore=('apikey',)):
+
+    '''
+    Check whether a page fetched earlier (e.g. by comp_mult_queries) can stand in for the first page of a request
+    Input:  page (dict)    --> {'params': parameters of the earlier request, 'results': raw response}
+            params (dict)  --> parameters of the new request
+            ignore (tuple) --> parameters that don't change the results (lowercase)
+    Output: reusable (bool) --> True, if both requests start at the same offset, the earlier one returned at least
+                                as many results and all other parameters are equal
+    '''
+
+    def other(p):
+        return {k: ','.join(sorted(str(v).split(','))) if k == 'fields' else str(v)
+                for k, v in p.items() if k not in ('offset', 'limit') and k.lower() not in ignore}
+
+    old = page['params']
+    return (int(old.get('offset', 0)) == int(params.get('offset', 0)) and
+            int(old.get('limit', 100)) >= int(params.get('limit', 100)) and other(old) == other(params))
@@ -2,18 +2,53 @@ import os
 import pandas as pd
 import requests
 import string
+import threading
 
 from tqdm import tqdm
 from os.path import join
 
+from ai4ki_utils import http_client
+from ai4ki_utils.cache_utils import SqliteCache
+from ai4ki_utils.crossref_utils import lookup_doi
+from ai4ki_utils.download_utils import download_files
+from ai4ki_utils.enrich_utils import enrich_concurrent
 
-def pdf_download(filename, pdf_dir='./pdfs', fraction=64):
+
+# Set the unpaywall.org base URL
+UNPAYWALL_URL = 'https://api.unpaywall.org/v2/'
+
+# Look-up results are cached for 30 days, failed look-ups (no DOI or no PDF) for 3 days only
+LOOKUP_TTL = 30*24*3600
+NEGATIVE_TTL = 3*24*3600
+
+_lookup_cache = None
+_lookup_cache_lock = threading.Lock()
+
+
+def lookup_cache():
+    
+    '''
+    Return the persistent cache for DOI and unpaywall.org look-ups (created on first use)
+    Output: cache (SqliteCache) --> look-up cache
+    '''
+    
+    global _lookup_cache
+    with _lookup_cache_lock:
+        if _lookup_cache is None:
+            _lookup_cache = SqliteCache('pdf_lookup', ttl=LOOKUP_TTL)
+
+    return _lookup_cache
+
+
+def pdf_download(filename, pdf_dir='./pdfs', fraction=64, max_workers=8):
     
     '''
-    Function for downloading PDFs from an Excel file that contains direct PDF download links
-    Input:  filename (str) --> name of the Excel file with publication records
-            dir_path (str) --> path of directory in which to store downloaded PDFs
-            fraction (int) --> fraction of characters from publication title for constrcuting PDF filename
+    Function for downloading PDFs from an Excel file that contains direct PDF download links; files that are
+    already complete are skipped, interrupted downloads are resumed and the outcomes are written to a manifest
+    Input:  filename (str)    --> name of the Excel file with publication records
+            dir_path (str)    --> path of directory in which to store downloaded PDFs
+            fraction (int)    --> fraction of characters from publication title for constrcuting PDF filename
+            max_workers (int) --> number of concurrent downloads
     Output: None
     '''
     
@@ -25,9 +60,10 @@ def pdf_download(filename, pdf_dir='./pdfs', fraction=64):
 
     fail_count = 0
     pub_count = 0
+    jobs = []
     
     # Loop over publication records
-    for pub in tqdm(pub_data):
+    for pub in pub_data:
         pub_count += 1
         link, title = '',''
         for k,v in pub.items():
@@ -41,19 +77,14 @@ def pdf_download(filename, pdf_dir='./pdfs', fraction=64):
             else:
                 title_frac = str(pub_count)
             pdf_name = title_frac + '.pdf'
-            file_path = join(pdf_dir, pdf_name)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-            # Download PDF
-            r = requests.get(link)
-            if r.status_code == 200:
-                with open(file_path, 'wb') as f:
-                    f.write(r.content)
-            else:
-                fail_count += 1
+            jobs.append((link, pdf_name))
         else:
             fail_count += 1
 
+    # Download PDFs
+    outcomes = download_files(jobs, pdf_dir, max_workers=max_workers)
+    fail_count += sum(1 for o in outcomes if o['status'] == 'failed')
+
     if fail_count != 0:
         print('{} PDFs could not be downloaded!'.format(fail_count))
 
@@ -61,109 +92,167 @@ def pdf_download(filename, pdf_dir='./pdfs', fraction=64):
 
 
 
-def find_pdfs(filename, pdf_dir='./pdfs', fraction=64):
+def unpaywall_pdf_url(doi):
     
     '''
-    Function for finding an downloading PDFs for publications listed in an Excel file (using the unpaywall.org REST API)
-    Input:  filename (str) --> name of the Excel file with publication records
-            dir_path (str) --> path of directory in which to store PDFs
-            fraction (int) --> fraction of characters from publication title for constructing PDF filename
-    Output: None
+    Function for looking up the best open access PDF link of a publication with the unpaywall.org REST API;
+    results (including publications without PDF) are kept in the persistent lookup cache
+    Input:  doi (str)     --> publication Digital Object Identifier
+    Output: pdf_url (str) --> link to the PDF (None, if unpaywall.org doesn't know any)
+    '''
+    
+    key = 'unpaywall:' + doi.lower()
+    cached = lookup_cache().get(key)
+    if cached is not None:
+        return cached['value']
+
+    get_url = UNPAYWALL_URL + doi + '?email=ai4ki.dev@gmail.com'
+    r = http_client.get(get_url)
+
+    if r.status_code == 200:
+        try:
+            # Get the golden link
+            pdf_url = r.json()['best_oa_location']['url_for_pdf']
+        except (KeyError, TypeError, ValueError):
+            pdf_url = None
+    elif r.status_code == 404:
+        pdf_url = None
+    else:
+        # Don't cache server errors, just try again next time
+        return None
+
+    lookup_cache().set(key, {'value': pdf_url}, ttl=LOOKUP_TTL if pdf_url else NEGATIVE_TTL)
+
+    return pdf_url
+
+
+def cached_get_doi(title, authors):
+    
+    '''
+    Function for getting the DOI of a publication from its title and author(s) with the Crossref REST API;
+    results (including publications without a match) are kept in the persistent lookup cache
+    Input:  title (str)   --> publication title
+            authors (str) --> publication's author(s)
+    Output: doi (str)     --> publication Digital Object Identifier
     '''
     
-    # Set the unpaywall.org base URL
-    BASE_URL = 'https://api.unpaywall.org/v2/'
+    key = 'doi:' + title.lower() + '|' + authors.lower()
+    cached = lookup_cache().get(key)
+    if cached is not None:
+        return cached['value']
+
+    try:
+        status, doi = lookup_doi(title, authors)
+    except (KeyError, ValueError):
+        # Malformed response, try again next time
+        return None
+    if status != 200 and status != 404:
+        # Don't cache server errors or rate limiting, just try again next time
+        return None
+    lookup_cache().set(key, {'value': doi}, ttl=LOOKUP_TTL if doi else NEGATIVE_TTL)
+
+    return doi
+
+
+def resolve_pdf(title, authors, doi):
+    
+    '''
+    Resolve the DOI (if missing) and the open access PDF link of a publication
+    Input:  title (str)   --> publication title
+            authors (str) --> publication's author(s)
+            doi (str)     --> publication Digital Object Identifier ('' if unknown)
+    Output: doi (str)     --> publication Digital Object Identifier
+            pdf_url (str) --> link to the PDF
+    '''
+    
+    # If Excel file doesn't contain DOI, get it from Crossref
+    if not doi:
+        doi = cached_get_doi(title, authors) if title else None
+    if not doi:
+        return None, None
+
+    # Unpaywall expects the bare DOI
+    for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:'):
+        if doi.lower().startswith(prefix):
+            doi = doi[len(prefix):]
+
+    return doi, unpaywall_pdf_url(doi)
+
+
+def resolve_pdfs(filename, fraction=64, max_workers=8):
+    
+    '''
+    Function for resolving the PDF links of publications listed in an Excel file (using the Crossref and unpaywall.org
+    REST APIs); the look-ups run concurrently and are cached, the returned jobs can be downloaded later with
+    download_utils.download_files
+    Input:  filename (str)    --> name of the Excel file with publication records
+            fraction (int)    --> fraction of characters from publication title for constructing PDF filename
+            max_workers (int) --> number of concurrent look-ups
+    Output: jobs (list)       --> list of (pdf_url, pdf_name) tuples for publications with a PDF link
+            n_pubs (int)      --> number of publication records in the Excel file
+    '''
     
     # Read the input Excel file
     df = pd.read_excel(filename, engine='openpyxl', index_col=None)
     pub_data = df.to_dict('records')
     
-    print('==> Searching for PDFs...')
-    
-    fail_count = 0
     pub_count = 0 
+    jobs = []
+    lookups = []
     
-    # Loop over publication records
-    for pub in tqdm(pub_data):
-        pub_count += 1
+    # Collect title, authors and DOI of each publication record (empty cells are read as NaN)
+    for pub in pub_data:
         title, authors, doi = '', '', ''
         for k,v in pub.items():
+            if not isinstance(v, str):
+                continue
             if k.lower() in 'title':
                 title = v
             if k.lower() in 'authors':
                 authors = v
             if k.lower() in 'doi':
                 doi = v
-        
-        # If Excel file doesn't contain DOI, get it from Crossref
-        if not doi: 
-            doi = get_doi(title, authors)
-    
-        if doi:
+        lookups.append((title, authors, doi.strip()))
+
+    # Resolve DOIs and PDF links
+    resolved = enrich_concurrent(resolve_pdf, lookups, max_workers=max_workers, desc='Look-ups')
+
+    for (title, _, _), res in zip(lookups, resolved):
+        pub_count += 1
+        pdf_url = res[1] if res is not None else None
+        if pdf_url:
             if title:
                 title_frac = title[:fraction].translate(str.maketrans('', '', string.punctuation)).replace(' ', '_')
             else:
                 title_frac = str(pub_count)
             pdf_name = title_frac + '.pdf'
-            file_path = join(pdf_dir, pdf_name)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Access the API endpoint
-            get_url = BASE_URL + doi + '?email=ai4ki.dev@gmail.com'
-            r_api = requests.get(get_url)
-            
-            if r_api.status_code == 200:
-                results = r_api.json()
-                try:
-                    # Get the golden link
-                    pdf_url = results['best_oa_location']['url_for_pdf']
-                    r_pdf = requests.get(pdf_url)
-                    
-                    # Download PDF
-                    if r_pdf.status_code == 200:
-                        with open(file_path, 'wb') as f:
-                            f.write(r_pdf.content)
-                    else:
-                        fail_count += 1
-                except:
-                    fail_count += 1
-            else:
-                fail_count += 1
-        else:
-            fail_count += 1
+            jobs.append((pdf_url, pdf_name))
 
-    print(f'==> Found PDFs for {pub_count-fail_count} publications; failed to find {fail_count} PDFs')
-    
-    return
-            
-            
-def get_doi(title, author):
+    return jobs, pub_count
+
+
+def find_pdfs(filename, pdf_dir='./pdfs', fraction=64, max_workers=8):
     
     '''
-    Function for getting DOI from publication title and author(s) with the Crossref REST API
-    Crossref REST API documentation: https://www.crossref.org/documentation/retrieve-metadata/rest-api/
-    Input:  title (str)       --> publication title
-            author (str)      --> publication's author(s)
-    Output: Found flag (bool) --> request successful/failed
-            doi (str)         --> publication Digital Object Identifier
+    Function for finding an downloading PDFs for publications listed in an Excel file (using the unpaywall.org REST API)
+    The PDF links of all publications are resolved first (see resolve_pdfs), then the PDFs are downloaded
+    Input:  filename (str)    --> name of the Excel file with publication records
+            dir_path (str)    --> path of directory in which to store PDFs
+            fraction (int)    --> fraction of characters from publication title for constructing PDF filename
+            max_workers (int) --> number of concurrent look-ups and downloads
+    Output: None
     '''
     
-    CROSSREF_URL = "http://api.crossref.org/"
-
-    title = title.replace(' ', '%20')
-    author = author.replace(' ', '%20')
-    doi = None
+    print('==> Searching for PDFs...')
 
-    url = "{}works?query.bibliographic={},{}&rows=1"
-    url = url.format(CROSSREF_URL, title, author)
-    r = requests.get(url)
+    # Phase 1: resolve DOIs and PDF links
+    jobs, pub_count = resolve_pdfs(filename, fraction=fraction, max_workers=max_workers)
+    fail_count = pub_count - len(jobs)
 
-    if r.status_code == 200:
-        data = r.json()
-        doi = data['message']['items'][0]['DOI']
+    # Phase 2: download PDFs
+    outcomes = download_files(jobs, pdf_dir, max_workers=max_workers)
+    fail_count += sum(1 for o in outcomes if o['status'] == 'failed')
 
-    return doi
-    
-    
-    
+    print(f'==> Found PDFs for {pub_count-fail_count} publications; failed to find {fail_count} PDFs')
     
+    return
@@ -0,0 +1,143 @@
+from collections.abc import MutableMapping
+
+
+# Publication fields (in the column order of exports) and the attribute names under which they are stored
+FIELDS = ('Title', 'Abstract', 'Authors', 'Year', 'DOI', 'BibTex', 'Fields of Study', 'Citations', 'Open Access',
+          'URL', 'Full text url', 'CORE PDF link', 'Rank score', 'Title match score', 'Abstract match score',
+          'Similarity score', 'Occurrence count')
+ATTRS = tuple(f.lower().replace(' ', '_') for f in FIELDS)
+
+_FIELD2ATTR = dict(zip(FIELDS, ATTRS))
+
+
+class PubRecord(MutableMapping):
+
+    '''
+    Compact record of one publication: the known fields are stored in slots (so a record needs a fraction of the
+    memory of a dict) and can be read and written as attributes, e.g. pub.title or pub.rank_score. For compatibility,
+    the record also behaves like a dict with the field names as keys (pub['Title']); other keys are kept in an extra
+    dict. Fields that were never set are missing, just like missing dict keys.
+    Input:  fields --> initial field values as keyword arguments with attribute names (e.g. title='...')
+    '''
+
+    __slots__ = ATTRS + ('_extra',)
+
+    def __init__(self, **fields):
+
+        self._extra = None
+        for attr, value in fields.items():
+            setattr(self, attr, value)
+
+    @classmethod
+    def from_dict(cls, d):
+
+        '''
+        Create a record from a dict with field names as keys
+        '''
+
+        record = cls()
+        for k, v in d.items():
+            record[k] = v
+        return record
+
+    def to_dict(self):
+
+        '''
+        Return the record as a dict (known fields in the order of FIELDS, followed by the other keys)
+        '''
+
+        d = {}
+        for field, attr in _FIELD2ATTR.items():
+            try:
+                d[field] = getattr(self, attr)
+            except AttributeError:
+                pass
+        if self._extra:
+            d.update(self._extra)
+        return d
+
+    def __getitem__(self, key):
+
+        attr = _FIELD2ATTR.get(key)
+        if attr is None:
+            if self._extra and key in self._extra:
+                return self._extra[key]
+            raise KeyError(key)
+        try:
+            return getattr(self, attr)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+
+        attr = _FIELD2ATTR.get(key)
+        if attr is not None:
+            setattr(self, attr, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+
+        attr = _FIELD2ATTR.get(key)
+        try:
+            if attr is not None:
+                delattr(self, attr)
+            else:
+                del self._extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key) from None
+
+    def __iter__(self):
+
+        for field, attr in _FIELD2ATTR.items():
+            if hasattr(self, attr):
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+
+        return 'PubRecord({!r})'.format(self.to_dict())
+
+    def __getstate__(self):
+
+        return self.to_dict()
+
+    def __setstate__(self, state):
+
+        self._extra = None
+        for k, v in state.items():
+            self[k] = v
+
+
+def as_records(pub_data):
+
+    '''
+    Convert the publication data of several files to PubRecords in place (items that are PubRecords already are kept)
+    Input:  pub_data (list) --> list of lists with publication data (dicts or PubRecords)
+    Output: pub_data (list) --> the same lists, holding PubRecords only
+    '''
+
+    for file_data in pub_data:
+        for j, item in enumerate(file_data):
+            if not isinstance(item, PubRecord):
+                file_data[j] = PubRecord.from_dict(item)
+
+    return pub_data
+
+
+def to_dicts(records):
+
+    '''
+    Convert a list of publication records to plain dicts (e.g. for exports)
+    Input:  records (list) --> list with publication data (dicts or PubRecords)
+    Output: dicts (list)   --> list with one dict per publication
+    '''
+
+    return [r.to_dict() if isinstance(r, PubRecord) else r for r in records]
@@ -0,0 +1,117 @@
+import pandas as pd
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from os.path import join
+
+from ai4ki_utils.jsonl_utils import JSNL_XTNSN, JsonlWriter, iter_records
+from ai4ki_utils.result_store import append_results, new_run_id
+
+
+XCL_XTNSN, BBT_XTNSN = '.xlsx', '.bib'
+
+
+def process_query(i, query, url, params, stream, out_dir, prefix, max_results=None, store=None, provider=None):
+
+    '''
+    Fetch, format and export the results of one query; each formatted page is written to the JSONL and BibTex
+    files right away, the Excel file is created from the JSONL file at the end
+    Input:  i (int)            --> index of the query (used in the output filename)
+            query (str)        --> search string
+            url (str)          --> URL of API endpoint with the query
+            params (dict)      --> dictionary with search parameters
+            stream (callable)  --> generator function yielding formatted pages (e.g. stream_semschol_data)
+            out_dir (str)      --> path to output directory
+            prefix (str)       --> prefix of the output filename
+            max_results (int)  --> number of results per query (None = one page)
+            store (str)        --> path to a result store; if given, the results are appended to the store instead of
+                                   being exported to Excel, BibTex and JSONL files
+            provider (str)     --> name of the search provider (stored with the results)
+    Output: summary (dict)     --> timings, number of results and error message for the query
+    '''
+
+    summary = {'Query': query, 'Total hits': None, 'Papers': 0, 'Fetch time': 0.0, 'Format time': 0.0,
+               'Export time': 0.0, 'Outfile': None, 'Error': None}
+    info = {}
+    results_form = []
+    writer, bib_file = None, None
+    outfile = prefix + str(i) + '_' + datetime.now().strftime("%Y-%m-%d-%H%M%S")
+
+    try:
+        # Fetch and format the data page by page; formatting one page overlaps with fetching the next
+        t_start = time.time()
+        export_time = 0.0
+        for page_form in stream(url, params, max_results=max_results, info=info):
+            summary['Papers'] += len(page_form)
+            if store is not None:
+                results_form += page_form
+                continue
+
+            t_export = time.time()
+            if writer is None:
+                writer = JsonlWriter(join(out_dir, outfile + JSNL_XTNSN))
+                bib_file = open(join(out_dir, outfile + BBT_XTNSN), 'w', encoding='utf-8')
+            writer.write(page_form)
+            for item in page_form:
+                if item['BibTex'] is not None:
+                    bib_file.write(item['BibTex'] if bib_file.tell() == 0 else '\n\n' + item['BibTex'])
+            bib_file.flush()
+            export_time += time.time() - t_export
+
+        summary['Total hits'] = info.get('total')
+        summary['Format time'] = info.get('format_time', 0.0)
+        summary['Fetch time'] = time.time() - t_start - summary['Format time'] - export_time
+
+        t_start = time.time()
+        if results_form:
+            summary['Outfile'] = append_results(results_form, store, new_run_id(), query, provider)
+        elif writer is not None:
+            writer.close()
+            bib_file.close()
+            df_out = pd.DataFrame(iter_records(writer.path))
+            df_out.to_excel(join(out_dir, outfile + XCL_XTNSN), engine='openpyxl', index=False)
+            summary['Outfile'] = outfile
+        else:
+            summary['Error'] = 'No results'
+        summary['Export time'] = export_time + time.time() - t_start
+    except Exception as e:
+        summary['Error'] = str(e)
+    finally:
+        # Records written before a failure are kept in the JSONL file
+        if writer is not None:
+            writer.close()
+            bib_file.close()
+
+    return summary
+
+
+def run_queries(queries, process, max_parallel=3):
+
+    '''
+    Run 'process' for all queries with up to 'max_parallel' queries in flight at once
+    Input:  queries (list)      --> list with user queries
+            process (callable)  --> process(i, query) returns the summary dict of query i
+            max_parallel (int)  --> maximum number of queries processed at the same time
+    Output: summary (list)      --> list with one summary dict per query (in the order of 'queries')
+    '''
+
+    print('PROCESSING QUERIES:')
+    print('===================')
+    for i, q in enumerate(queries):
+        print('Query {}: {}'.format(i, q))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        summary = list(pool.map(process, range(len(queries)), queries))
+
+    print('===================')
+    print('SUMMARY:')
+    print('===================')
+    for i, s in enumerate(summary):
+        if s['Error'] is None:
+            print('Query {i}: {n} papers (fetch {f:.1f}s, format {fm:.1f}s, export {e:.1f}s) --> {o}'.format(
+                  i=i, n=s['Papers'], f=s['Fetch time'], fm=s['Format time'], e=s['Export time'], o=s['Outfile']))
+        else:
+            print('Query {i}: FAILED ({err})'.format(i=i, err=s['Error']))
+
+    return summary
@@ -0,0 +1,212 @@
+import itertools
+import random
+import urllib.parse
+
+from functools import lru_cache
+
+from ai4ki_utils import boolean_query, search_cache
+from ai4ki_utils.boolean_query import canonical_string, make_term, parse_query, to_query_string
+from ai4ki_utils.smart_query_utils import find_synonyms
+
+
+# Maximum number of variants generated from one query (larger variant spaces are sampled)
+MAX_VARIANTS = 1000
+
+# Two queries are treated as redundant, if their redundancy is above this value (same meaning as min_match
+# in comp_mult_queries)
+MAX_REDUNDANCY = 0.7
+
+# Search endpoints as used by comp_mult_queries: URL prefix, key of the result list and key of the paper ID
+SEARCH_ENDPOINTS = {
+    'semschol': ('https://api.semanticscholar.org/graph/v1/paper/search?query=', 'data', 'paperId'),
+    'core': ('https://api.core.ac.uk/v3/search/works?q=', 'results', 'id'),
+}
+
+
+def _term(word):
+
+    # WordNet lemma names join the words of phrases with underscores; phrases are quoted in queries
+    return to_query_string(make_term(word))
+
+
+def canonical_query(query):
+
+    '''
+    Canonical form of a query (see boolean_query.canonicalize), so that variants differing only in case, order of
+    operands, redundant parentheses or quoting of single words are recognized as duplicates
+    Input:  query (str) --> search string
+    Output: key (str)   --> canonical form of the query
+    '''
+
+    try:
+        return canonical_string(query)
+    except ValueError:
+        # Not a valid Boolean query (e.g. unbalanced parentheses): normalize case and whitespace only
+        return ' '.join(query.lower().split())
+
+
+@lru_cache(maxsize=100000)
+def query_terms(query):
+
+    '''
+    Set of search terms of a query (phrases are one term)
+    Input:  query (str)  --> search string
+    Output: terms (set)  --> set of lower-case terms
+    '''
+
+    try:
+        return frozenset(t.text.lower() for t in boolean_query.query_terms(parse_query(query)))
+    except ValueError:
+        # Not a valid Boolean query (e.g. unbalanced parentheses): use the words without parentheses and operators
+        words = query.replace('(', ' ').replace(')', ' ').replace('"', ' ').split()
+        return frozenset(w.lower() for w in words if w not in boolean_query.OPERATORS)
+
+
+def enumerate_variants(query_syns, max_variants=MAX_VARIANTS, seed=None):
+
+    '''
+    Generate query variants from the output of find_synonyms: all combinations of synonyms, or a random sample of
+    them, if there are more than 'max_variants' combinations; duplicates are removed by their canonical form
+    Input:  query_syns (list)   --> list containing either words or lists of words' synonyms (see find_synonyms)
+            max_variants (int)  --> maximum number of variants
+            seed (int)          --> seed of the random generator used for sampling
+    Output: variants (list)     --> list of search strings; the first one uses the first entry of each synonym list
+                                    (the original word)
+    '''
+
+    slots = [[_term(w) for w in q] if isinstance(q, list) else [q] for q in query_syns if q]
+    n_combinations = 1
+    for s in slots:
+        n_combinations *= len(s)
+
+    if n_combinations <= max_variants:
+        combinations = itertools.product(*slots)
+    else:
+        # Sample combinations; the number of draws is bounded, since many of them may be duplicates
+        rng = random.Random(seed)
+        first = tuple(s[0] for s in slots)
+        samples = (tuple(rng.choice(s) for s in slots) for _ in range(10 * max_variants))
+        combinations = itertools.chain([first], samples)
+
+    variants = {}
+    for c in combinations:
+        query = ' '.join(c)
+        variants.setdefault(canonical_query(query), query)
+        if len(variants) >= max_variants:
+            break
+
+    return list(variants.values())
+
+
+def cached_result_ids(queries, provider='semschol', params=None):
+
+    '''
+    IDs of the results of each query that are in the search cache (no requests are sent); the queries are looked
+    up with the parameters of comp_mult_queries by default
+    Input:  queries (list)    --> list with search strings
+            provider (str)    --> name of the search provider ('semschol' or 'core')
+            params (dict)     --> query parameters of the cached requests (None = those of comp_mult_queries)
+    Output: result_ids (dict) --> dictionary with a list of paper IDs for each query found in the cache
+    '''
+
+    if provider not in SEARCH_ENDPOINTS:
+        raise ValueError('Unknown provider {!r} (use one of {})'.format(provider, ', '.join(SEARCH_ENDPOINTS)))
+    prefix, results_key, id_key = SEARCH_ENDPOINTS[provider]
+    if params is None:
+        params = {'offset': '0', 'limit': '100'}
+        if provider == 'semschol':
+            from ai4ki_utils.semschol_utils import FIELDS
+            params['fields'] = FIELDS
+
+    result_ids = {}
+    for q in queries:
+        url = prefix + (urllib.parse.quote(q) if provider == 'core' else q)
+        results = search_cache.get_search(provider, url, params)
+        if results is not None:
+            result_ids[q] = [r[id_key] for r in results[results_key]]
+
+    return result_ids
+
+
+def redundancy(query_a, query_b, result_ids=None):
+
+    '''
+    Estimate how redundant two queries are: the share of shared results (relative to the shorter result list, as in
+    comp_mult_queries), if the results of both queries are known, and the Jaccard similarity of their terms otherwise
+    Input:  query_a (str)       --> first search string
+            query_b (str)       --> second search string
+            result_ids (dict)   --> dictionary with a list of result IDs for (some) queries
+    Output: redundancy (float)  --> value between 0 (nothing in common) and 1 (same results/terms)
+    '''
+
+    if result_ids and query_a in result_ids and query_b in result_ids:
+        ids_a, ids_b = set(result_ids[query_a]), set(result_ids[query_b])
+        if ids_a and ids_b:
+            return len(ids_a & ids_b) / min(len(ids_a), len(ids_b))
+
+    terms_a, terms_b = query_terms(query_a), query_terms(query_b)
+    if not terms_a and not terms_b:
+        return 1.0
+
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+def select_variants(variants, budget=5, max_redundancy=MAX_REDUNDANCY, result_ids=None):
+
+    '''
+    Greedily pick a small, diverse set of variants: starting with the first variant, the variant least redundant
+    with all variants picked so far is added, until the budget is used or all remaining variants are redundant
+    Input:  variants (list)         --> list with search strings
+            budget (int)            --> maximum number of variants to pick (number of queries to send)
+            max_redundancy (float)  --> variants more redundant than this with any picked variant are dropped
+            result_ids (dict)       --> dictionary with a list of result IDs for (some) queries (see cached_result_ids)
+    Output: selected (list)         --> list with the picked search strings
+    '''
+
+    if not variants or budget < 1:
+        return []
+
+    selected = [variants[0]]
+    candidates = variants[1:]
+    # Highest redundancy of each candidate with the picked variants (updated after each pick)
+    max_red = [redundancy(variants[0], c, result_ids) for c in candidates]
+
+    while len(selected) < budget and candidates:
+        j = min(range(len(candidates)), key=max_red.__getitem__)
+        if max_red[j] > max_redundancy:
+            break
+        picked = candidates.pop(j)
+        max_red.pop(j)
+        selected.append(picked)
+        max_red = [max(r, redundancy(picked, c, result_ids)) for r, c in zip(max_red, candidates)]
+
+    return selected
+
+
+def query_variants(query, budget=5, max_redundancy=MAX_REDUNDANCY, max_variants=MAX_VARIANTS, provider=None,
+                   params=None, seed=None):
+
+    '''
+    Function for creating a small set of diverse query variants by replacing words with synonyms
+    Input:  query (str)             --> search string
+            budget (int)            --> maximum number of queries returned (including the original query)
+            max_redundancy (float)  --> maximum redundancy between any two returned queries
+            max_variants (int)      --> maximum number of variants considered
+            provider (str)          --> use cached results of this search provider to estimate redundancy
+                                        (None = compare the terms of the queries only)
+            params (dict)           --> query parameters of the cached requests (see cached_result_ids)
+            seed (int)              --> seed of the random generator used for sampling variants
+    Output: selected (list)         --> list with the original query followed by the picked variants
+    '''
+
+    variants = enumerate_variants(find_synonyms(query), max_variants=max_variants, seed=seed)
+    variants = [query] + [v for v in variants if canonical_query(v) != canonical_query(query)]
+    result_ids = cached_result_ids(variants, provider, params) if provider else None
+
+    selected = select_variants(variants, budget=budget, max_redundancy=max_redundancy, result_ids=result_ids)
+
+    print('Generated {} variants, selected {}:'.format(len(variants) - 1, len(selected) - 1))
+    for q in selected[1:]:
+        print('==>', q)
+
+    return selected
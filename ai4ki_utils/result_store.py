@@ -0,0 +1,206 @@
+import os
+import uuid
+
+from datetime import datetime
+from functools import lru_cache
+from os.path import exists, join
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+# Name of the store directory within the results directory
+STORE_NAME = 'pub_store'
+
+# Columns describing the query run, followed by the publication fields written by the format_*_data functions
+RUN_FIELDS = ['run_id', 'query', 'provider', 'rank', 'retrieved']
+RECORD_FIELDS = ['Title', 'Abstract', 'Authors', 'Year', 'DOI', 'BibTex', 'Fields of Study', 'Citations',
+                 'Open Access', 'URL', 'Full text url', 'CORE PDF link']
+
+
+def _require_pyarrow():
+
+    if pa is None:
+        raise ImportError('The result store needs pyarrow (pip install pyarrow)')
+
+
+@lru_cache(maxsize=None)
+def store_schema():
+
+    '''
+    Fixed schema of the result store
+    Output: schema (pyarrow.Schema) --> column names and types
+    '''
+
+    _require_pyarrow()
+    types = {'rank': pa.int32(), 'retrieved': pa.timestamp('s'), 'Year': pa.int32(), 'Citations': pa.int64(),
+             'Open Access': pa.bool_()}
+
+    return pa.schema([(name, types.get(name, pa.string())) for name in RUN_FIELDS + RECORD_FIELDS])
+
+
+def new_run_id():
+
+    '''
+    Create a unique ID for a query run (time stamp with microseconds plus a random suffix, so IDs sort by the time
+    the runs were started)
+    Output: run_id (str) --> query run ID
+    '''
+
+    return datetime.now().strftime('%Y-%m-%d-%H%M%S-%f') + '-' + uuid.uuid4().hex[:6]
+
+
+def _convert(value, arrow_type):
+
+    # Convert a field to the type of its column (e.g. Google Scholar years are strings); unusable values become null
+    if value is None:
+        return None
+    try:
+        if pa.types.is_integer(arrow_type):
+            return int(value)
+        if pa.types.is_boolean(arrow_type):
+            return bool(value)
+    except (TypeError, ValueError):
+        return None
+
+    return value if isinstance(value, str) else str(value)
+
+
+def append_results(results_form, store_path, run_id=None, query=None, provider=None):
+
+    '''
+    Append the formatted results of one query run to the store (as a new Parquet file; existing files are never
+    rewritten, so runs processed in parallel can be appended at the same time)
+    Input:  results_form (list) --> list with formatted publication data (in the order of their rank)
+            store_path (str)    --> path to store directory
+            run_id (str)        --> query run ID (None = new ID)
+            query (str)         --> search string of the run
+            provider (str)      --> name of the search provider (e.g. 'semschol')
+    Output: run_id (str)        --> query run ID
+    '''
+
+    _require_pyarrow()
+    schema = store_schema()
+    run_id = run_id or new_run_id()
+    retrieved = datetime.now().replace(microsecond=0)
+
+    columns = {'run_id': [run_id] * len(results_form), 'query': [query] * len(results_form),
+               'provider': [provider] * len(results_form), 'rank': list(range(len(results_form))),
+               'retrieved': [retrieved] * len(results_form)}
+    for name in RECORD_FIELDS:
+        arrow_type = schema.field(name).type
+        columns[name] = [_convert(item.get(name), arrow_type) for item in results_form]
+
+    os.makedirs(store_path, exist_ok=True)
+    table = pa.table(columns, schema=schema)
+    pq.write_table(table, join(store_path, '{}-{}.parquet'.format(run_id, uuid.uuid4().hex[:8])))
+
+    return run_id
+
+
+def load_results(store_path, runs=None, columns=None, filter=None):
+
+    '''
+    Load results from the store; only the requested columns are read and the filters are pushed down to the
+    Parquet files, so runs and row groups that don't match are skipped
+    Input:  store_path (str)  --> path to store directory
+            runs (list)       --> query run IDs to load (None = all runs)
+            columns (list)    --> columns to load (None = all columns)
+            filter            --> additional pyarrow.dataset expression, e.g. ds.field('Year') >= 2015
+    Output: table (pyarrow.Table) --> selected results
+    '''
+
+    _require_pyarrow()
+    if not exists(store_path):
+        schema = store_schema() if columns is None else pa.schema([store_schema().field(c) for c in columns])
+        return schema.empty_table()
+
+    dataset = ds.dataset(store_path, format='parquet', schema=store_schema())
+    expr = filter
+    if runs is not None:
+        run_filter = ds.field('run_id').isin(list(runs))
+        expr = run_filter if expr is None else expr & run_filter
+
+    return dataset.to_table(columns=columns, filter=expr)
+
+
+def list_runs(store_path):
+
+    '''
+    Overview of the query runs in the store
+    Input:  store_path (str)    --> path to store directory
+    Output: runs (DataFrame)    --> run ID, query, provider, time and number of results of each run
+    '''
+
+    table = load_results(store_path, columns=['run_id', 'query', 'provider', 'retrieved'])
+    df = table.to_pandas()
+
+    return df.groupby(['run_id', 'query', 'provider'], dropna=False).agg(
+        retrieved=('retrieved', 'min'), results=('retrieved', 'size')).reset_index().sort_values('run_id')
+
+
+def load_pub_data(store_path, runs=None, columns=None, filter=None):
+
+    '''
+    Load publication data from the store in the layout of get_pub_data (one list of records per query run)
+    Input:  store_path (str)  --> path to store directory
+            runs (list)       --> query run IDs to load (None = all runs)
+            columns (list)    --> publication fields to load (None = all fields)
+            filter            --> additional pyarrow.dataset expression
+    Output: pub_data (list)   --> list with publication data from each query run (sorted by rank)
+            run_ids (list)    --> query run ID of each list
+    '''
+
+    if columns is not None:
+        columns = ['run_id', 'rank'] + [c for c in columns if c not in ('run_id', 'rank')]
+    table = load_results(store_path, runs, columns, filter)
+    table = table.sort_by([('run_id', 'ascending'), ('rank', 'ascending')])
+
+    pub_data, run_ids = [], []
+    for record in table.to_pylist():
+        if not run_ids or record['run_id'] != run_ids[-1]:
+            run_ids.append(record['run_id'])
+            pub_data.append([])
+        pub_data[-1].append(record)
+
+    return pub_data, run_ids
+
+
+def export_excel(store_path, filename, runs=None, columns=None, filter=None):
+
+    '''
+    Export results from the store to an Excel file
+    Input:  store_path (str)  --> path to store directory
+            filename (str)    --> path of the Excel file
+            runs (list)       --> query run IDs to export (None = all runs)
+            columns (list)    --> columns to export (None = publication fields only)
+            filter            --> additional pyarrow.dataset expression
+    Output: n_rows (int)      --> number of exported results
+    '''
+
+    df = load_results(store_path, runs, columns or RECORD_FIELDS, filter).to_pandas()
+    df.to_excel(filename, engine='openpyxl', index=False)
+
+    return len(df)
+
+
+def export_bibtex(store_path, filename, runs=None, filter=None):
+
+    '''
+    Export the BibTex entries of results in the store to a .bib file
+    Input:  store_path (str)  --> path to store directory
+            filename (str)    --> path of the .bib file
+            runs (list)       --> query run IDs to export (None = all runs)
+            filter            --> additional pyarrow.dataset expression
+    Output: n_entries (int)   --> number of exported BibTex entries
+    '''
+
+    entries = [b for b in load_results(store_path, runs, ['BibTex'], filter).column('BibTex').to_pylist() if b]
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(entries))
+
+    return len(entries)
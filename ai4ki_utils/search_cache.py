@@ -0,0 +1,120 @@
+import threading
+import time
+import urllib.parse
+
+from ai4ki_utils.cache_utils import SqliteCache
+
+
+# Search results are kept for 30 days, but by default only results younger than one day are reused
+SEARCH_CACHE_TTL = 30*24*3600
+SEARCH_CACHE_SIZE = 50000
+SEARCH_MAX_AGE = 24*3600
+
+# Parameters that don't change the results (and must not end up in the cache file)
+IGNORED_PARAMS = ('apikey', 'api_key', 'key')
+
+_config = {'enabled': True, 'max_age': SEARCH_MAX_AGE, 'cache_only': False}
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def search_cache():
+
+    '''
+    Return the persistent cache for search results (created on first use)
+    Output: cache (SqliteCache) --> search result cache
+    '''
+
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SqliteCache('search', ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_SIZE)
+
+    return _search_cache
+
+
+def configure_search_cache(enabled=None, max_age=None, cache_only=None):
+
+    '''
+    Change how search results are cached (arguments that are None keep their current setting)
+    Input:  enabled (bool)     --> reuse and store search results
+            max_age (float)    --> reuse cached results younger than max_age seconds (0 = never reuse them)
+            cache_only (bool)  --> offline mode: only serve cached results (of any age), never call the APIs
+    Output: config (dict)      --> current settings
+    '''
+
+    if enabled is not None:
+        _config['enabled'] = enabled
+    if max_age is not None:
+        _config['max_age'] = max_age
+    if cache_only is not None:
+        _config['cache_only'] = cache_only
+
+    return dict(_config)
+
+
+def cache_only():
+
+    '''
+    Return True, if search results are only served from the cache
+    '''
+
+    return _config['enabled'] and _config['cache_only']
+
+
+def search_key(provider, url, params=None):
+
+    '''
+    Cache key of a search request: provider, endpoint and the sorted query parameters (the query string in the URL
+    and 'params' are merged, URL encoding and redundant whitespace are removed, API keys are dropped)
+    Input:  provider (str) --> name of the search provider (e.g. 'semschol')
+            url (str)      --> URL of API endpoint (including the query string, if any)
+            params (dict)  --> query parameters
+    Output: key (str)      --> cache key
+    '''
+
+    parts = urllib.parse.urlsplit(url)
+    pairs = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    pairs += [(k, str(v)) for k, v in (params or {}).items() if v is not None]
+    pairs = sorted((k, ' '.join(v.split())) for k, v in pairs if k.lower() not in IGNORED_PARAMS)
+
+    return '{}|{}{}?{}'.format(provider, parts.netloc.lower(), parts.path, urllib.parse.urlencode(pairs))
+
+
+def get_search(provider, url, params=None, max_age=None):
+
+    '''
+    Return the cached results of a search request, if they are fresh enough
+    Input:  provider (str)   --> name of the search provider
+            url (str)        --> URL of API endpoint
+            params (dict)    --> query parameters
+            max_age (float)  --> maximum age of the results in seconds (None = configured max_age)
+    Output: results          --> cached response data (None, if there is none)
+    '''
+
+    if not _config['enabled']:
+        return None
+
+    entry = search_cache().get(search_key(provider, url, params))
+    if entry is None:
+        return None
+    max_age = _config['max_age'] if max_age is None else max_age
+    if not _config['cache_only'] and time.time() - entry['time'] > max_age:
+        return None
+
+    return entry['data']
+
+
+def put_search(provider, url, params, results):
+
+    '''
+    Store the results of a search request
+    Input:  provider (str)   --> name of the search provider
+            url (str)        --> URL of API endpoint
+            params (dict)    --> query parameters
+            results          --> JSON-serializable response data
+    '''
+
+    if _config['enabled']:
+        search_cache().set(search_key(provider, url, params), {'time': time.time(), 'data': results})
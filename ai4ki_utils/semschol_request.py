@@ -1,27 +1,81 @@
 import requests
 
-def semschol_request(url, params):
+from ai4ki_utils import http_client, search_cache
+from ai4ki_utils.page_utils import stream_pages
+
+# The search endpoint returns at most 1000 relevance-ranked results per query
+SEMSCHOL_MAX_RESULTS = 1000
+
+def semschol_request(url, params, verbose=True):
     # Function for sending a GET request to the Semantic Scholar API endpoint
+    # Results of recent identical requests are served from the local search cache (see search_cache)
     # Input variables: url (str) --> API endpoint, params (dir) --> query parameters
+    #                  verbose (bool) --> print the number of papers found
     # Output variables: status (boolean) --> True, if request returned results
     #                   results (dir) --> publication data
 
     status = False
-    results = None
+    results = search_cache.get_search('semschol', url, params)
+
+    if results is None:
+        if search_cache.cache_only():
+            print('No cached results for this request (cache-only mode)')
+            return status, results
+
+        try:
+            r = http_client.get(url, params=params)
+        except requests.RequestException as e:
+            print('Request failed: {}'.format(e))
+            return status, results
 
-    r = requests.get(url, params=params)
-    if r.status_code == 200:
-        results = r.json()
-        if results['total'] != 0:
-            status = True
+        if r.status_code == 200:
+            results = r.json()
+            search_cache.put_search('semschol', url, params, results)
+        elif r.status_code == 504:
+            print('Error code 504: Time out -- try again')
+            return status, results
+        else:
+            print('Error code {code}'.format(code=r.status_code))
+            return status, results
+
+    if results['total'] != 0:
+        status = True
+        if verbose:
             print('---------------------------------')
             print('Your query returned {total} papers'.format(total=results['total']))
             print('---------------------------------')
-            if results['total'] == 0:
-                print('==> Try another one!')
-    elif r.status_code == 504:
-        print('Error code 504: Time out -- try again')
-    else:
-        print('Error code {code}'.format(code=r.status_code))
-
-    return status, results
\ No newline at end of file
+        if results['total'] == 0:
+            print('==> Try another one!')
+
+    return status, results
+
+
+def semschol_pages(url, params, max_results=None, page_size=100, info=None, first_page=None):
+    # Generator for paging through the results of a Semantic Scholar query; the next page is fetched
+    # in the background while the current one is processed
+    # Input variables: url (str) --> API endpoint, params (dir) --> query parameters (offset is the first result)
+    #                  max_results (int) --> maximum number of results (None = up to the provider cap)
+    #                  page_size (int) --> number of results per request (at most 100)
+    #                  info (dir) --> if given, receives the total number of results in info['total']
+    #                  first_page (dir) --> raw response of an earlier request for the first page (not fetched again)
+    # Output variables: page (list) --> yields the publication data of one page at a time
+
+    start = int(params.get('offset', 0))
+
+    def fetch(offset, limit):
+        if first_page is not None and offset == start:
+            return first_page.get('data', [])[:limit], first_page['total']
+        page_params = dict(params, offset=str(offset), limit=str(limit))
+        status, results = semschol_request(url, page_params, verbose=offset == start)
+        if not status:
+            return None, 0
+        return results.get('data'), results['total']
+
+    return stream_pages(fetch, start, max_results, page_size, SEMSCHOL_MAX_RESULTS, info)
+
+
+def semschol_stream(url, params, max_results=None, page_size=100):
+    # Generator yielding the publication records of a Semantic Scholar query one by one (see semschol_pages)
+
+    for page in semschol_pages(url, params, max_results, page_size):
+        yield from page
@@ -1,27 +1,43 @@
 import json
+import os
 import pandas as pd
 import requests
 import sys
+import time
 sys.path.append('../')
 
 
-from ai4ki_utils.det_rbo import rbo
-from ai4ki_utils.semschol_request import semschol_request
+from ai4ki_utils.crossref_utils import bib_cache_stats, doi2bib, doi2bib_batch, print_bib_cache_stats
+from ai4ki_utils.enrich_utils import MAX_WORKERS
+from ai4ki_utils.page_utils import reusable_page
+from ai4ki_utils.pub_record import PubRecord
+from ai4ki_utils.query_runner import process_query, run_queries
+from ai4ki_utils.result_store import STORE_NAME
+from ai4ki_utils.det_rbo import rbo_matrix
+from ai4ki_utils.semschol_request import semschol_pages, semschol_request
 
 from datetime import datetime
+from functools import partial
 from os.path import join
 from tqdm import tqdm
 
 
-def comp_mult_queries(queries, min_match=0.7, min_rbo=0.5, p_value=0.9):
+# Fields returned by the API request (can be changed, see API documentation)
+FIELDS = 'title,url,authors,abstract,citationCount,externalIds,isOpenAccess,year,fieldsOfStudy'
+
+
+def comp_mult_queries(queries, min_match=0.7, min_rbo=0.5, p_value=0.9, fields=FIELDS, return_pages=False):
     
     '''
     Function for quickly comparing the results of different queries
-    Input:  queries (list)    --> list with different queries
-            min_match (float) --> treat two queries as equal, if they share at least min_match results
-            min_rbo (float)   --> treat two queries as equal, if their ranked biased overlap is > min_rbo
-            p_value (float)   --> p-value for calculating rank biased overlap (RBO)
-    Output: compare (dir)     --> dictionary with number of matches and RBO for each pair of queries
+    Input:  queries (list)        --> list with different queries
+            min_match (float)     --> treat two queries as equal, if they share at least min_match results
+            min_rbo (float)       --> treat two queries as equal, if their ranked biased overlap is > min_rbo
+            p_value (float)       --> p-value for calculating rank biased overlap (RBO)
+            fields (str)          --> fields to be returned by the API (None = paper Ids and titles only)
+            return_pages (bool)   --> also return the fetched pages, so proc_mult_queries doesn't request them again
+    Output: compare (dir)         --> dictionary with number of matches and RBO for each pair of queries
+            pages (dir)           --> (if return_pages) request parameters and raw results for each query
     '''
 
     # Set query parameters
@@ -31,135 +47,150 @@ def comp_mult_queries(queries, min_match=0.7, min_rbo=0.5, p_value=0.9):
         'offset': str(offset),
         'limit': str(limit),
     }
+    if fields:
+        params['fields'] = fields
 
     # Create dictionary with paper Ids for each query
     id_dict = {}
+    pages = {}
 
     # Loop over all queries and send corresponding request to the Semantic Scholar endpoint
     for i in range(len(queries)):
         # Set the Semantic Scholar base url
         url = 'https://api.semanticscholar.org/graph/v1/paper/search?query=' + queries[i]
 
-        # Make the request and fetch the data
-        r = requests.get(url, params=params)
-        if r.status_code == 200:
-            results = r.json()
+        # Make the request and fetch the data (or take them from the search cache)
+        status, results = semschol_request(url, params, verbose=False)
+        if results is not None:
             n_total = results['total']
             n_papers = len(results['data'])
             print('Found {} papers for query {}'.format(n_total, i))
             if n_total != 0:
                 id_dict[i] = [results['data'][j]['paperId'] for j in range(n_papers)]
+                pages[queries[i]] = {'params': params, 'results': results}
         else:
            print('ERROR while trying to request data for query {}'.format(i))
     
     # Determine the number of matches between each query pair and how their rankings compare
-    count = 1
-    matches = {}
-    rank_compare = {}
+    # (RBO and overlap of all pairs are computed at once; the rankings are compared up to the shorter list)
     compare = {}
     keys = [key for key in id_dict]
+    rbo_mat, overlap_mat = rbo_matrix([id_dict[key] for key in keys], p=p_value, truncate=True)
 
     print('------------------')
-    for k in range(len(id_dict)):
-        for l in range(count, len(id_dict)):
+    for k in range(len(keys)):
+        for l in range(k+1, len(keys)):
 
             m_key = (keys[k], keys[l])
-            # Calculate matches between pair (k,l)
-            intersection = set(id_dict[keys[k]]) & set(id_dict[keys[l]])
-            matches = len(intersection)
-
-            # Calculate RBO between pair (k,l)
+            matches = int(overlap_mat[k, l])
+            rank_compare = float(rbo_mat[k, l])
             min_papers = min(len(id_dict[keys[k]]), len(id_dict[keys[l]]))
-            rank_compare = rbo(id_dict[keys[k]][:min_papers], id_dict[keys[l]][:min_papers], p_value)
 
             print("Query {q_a:02d} and query {q_b:02d} have {match:02d} matches and their RBO is {rank:02f}".
                   format(q_a=keys[k], q_b=keys[l], match=matches, rank=rank_compare))
 
             compare[m_key] = [{'matches': matches/min_papers}, {'rbo': rank_compare}]
 
-        count += 1
-
     print('------------------')
     print('QUERY SUGGESTIONS:')
     print('------------------')
     for pair in compare.keys():
         if compare[pair][0]['matches'] > min_match or compare[pair][1]['rbo'] > min_rbo:
             print('==> Suggesting to skip either query {} or {}'.format(pair[0], pair[1]))
+
+    if return_pages:
+        return compare, pages
             
     return compare
 
 
 
-def proc_mult_queries(queries, params, out_dir='../results'):
+def proc_mult_queries(queries, params, out_dir='../results', max_results=None, max_parallel=3, pages=None,
+                      store=False):
     
     '''
-    Function for sending multiple queries to the Semantic Scholar API endpoint
-    Input:  queries (list) --> list with user queries
-            params (dict)  --> dictionary with search parameters
-    Output: None
+    Function for sending multiple queries to the Semantic Scholar API endpoint; up to 'max_parallel' queries are
+    fetched, formatted and exported at the same time (request rates are limited per API in http_client)
+    Input:  queries (list)      --> list with user queries
+            params (dict)       --> dictionary with search parameters
+            out_dir (str)       --> path to output directory
+            max_results (int)   --> number of results per query, fetched in pages of params['limit'] (None = one page)
+            max_parallel (int)  --> maximum number of queries in flight at once
+            pages (dict)        --> first pages fetched by comp_mult_queries(..., return_pages=True); queries found
+                                    here aren't requested again, if the pages were fetched with matching parameters
+            store (bool)        --> append the results to the result store in out_dir (see result_store) instead of
+                                    writing Excel, BibTex and JSON files for each query
+    Output: summary (list)      --> list with timings, number of results and failures for each query
     '''
     
-    XCL_XTNSN, JSN_XTNSN, BBT_XTNSN = '.xlsx', '.json', '.bib'
-    
     # Create output directory, if it doesn't exist
     if not os.path.exists(out_dir):
         os.makedirs(out_dir)
 
-    # Loop over all queries and send corresponding request to the Semantic Scholar endpoint
-    print('PROCESSING QUERIES:')
-    print('===================')
-    for i in range(len(queries)):
+    store_path = join(out_dir, STORE_NAME) if store else None
 
-        print('Query {}: {}'.format(i,queries[i].replace('%20',' ')))
-              
+    def process(i, query):
         # Set the Semantic Scholar base url
-        url = 'https://api.semanticscholar.org/graph/v1/paper/search?query=' + queries[i]
+        url = 'https://api.semanticscholar.org/graph/v1/paper/search?query=' + query
+        stream = stream_semschol_data
+        if pages and query in pages and reusable_page(pages[query], params):
+            stream = partial(stream_semschol_data, first_page=pages[query]['results'])
+        return process_query(i, query, url, params, stream, out_dir, 'MySemSchol_Search_Query_', max_results=max_results,
+                             store=store_path, provider='semschol')
 
-        # Make the request and fetch the data
-        status, results = semschol_request(url, params)
-        if status:
-            n_papers = len(results['data'])
-            print('==> Formatting publication data {beg} to {end}:'.
-                  format(beg=int(params['offset']), end=n_papers + int(params['offset']) - 1))
-            results_form = format_semschol_data(n_papers, results)
+    return run_queries(queries, process, max_parallel=max_parallel)
 
-            # Construct output filename
-            time_stamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
-            outfile = "MySemSchol_Search_Query_" + str(i) + '_' + str(time_stamp)
-            
-            # Export results to EXCEL file
-            df_out = pd.DataFrame(results_form)
-            df_out.to_excel(join(out_dir, outfile + XCL_XTNSN), engine='openpyxl', index=False)
-            
-            # Export BibTex-Data to .bib-file
-            bibtex_data = '\n\n'.join([item['BibTex'] for item in results_form if item['BibTex'] is not None])
-            with open(join(out_dir, outfile + BBT_XTNSN), 'w', encoding='utf-8') as f:
-                f.write(bibtex_data)
-              
-            # Export results to JSON file
-            with open(join(out_dir, outfile + JSN_XTNSN), 'w', encoding='utf-8') as f:
-                json.dump(results_form, f)
-
-            results_form = []
-            results = {}
-            df_out = None
-            bibtex_data = ''
-            url = ''
-
-def format_semschol_data(num_papers, results):
+
+def stream_semschol_data(url, params, max_results=None, max_workers=MAX_WORKERS, info=None, first_page=None):
+    
+    '''
+    Generator for fetching and formatting the results of a Semantic Scholar query page by page; the next page
+    is requested while the current one is being formatted
+    Input:  url (str)          --> URL of API endpoint with the query
+            params (dict)      --> dictionary with search parameters (offset of the first result, page size in limit)
+            max_results (int)  --> maximum number of results (None = one page)
+            max_workers (int)  --> number of concurrent workers for enriching the publication data
+            info (dict)        --> if given, receives the total number of results ('total') and the formatting time
+            first_page (dict)  --> raw response of an earlier request for the first page (not fetched again)
+    Output: page_form (list)   --> yields the formatted publication data of one page at a time
+    '''
+
+    offset = int(params.get('offset', 0))
+    page_size = int(params.get('limit', 100))
+    if max_results is None:
+        max_results = page_size
+
+    if info is None:
+        info = {}
+    info.setdefault('format_time', 0.0)
+
+    for page in semschol_pages(url, params, max_results=max_results, page_size=page_size, info=info,
+                             first_page=first_page):
+        print('==> Formatting publication data {beg} to {end}:'.format(beg=offset, end=offset + len(page) - 1))
+        t_start = time.time()
+        page_form = format_semschol_data(len(page), {'data': page}, max_workers=max_workers)
+        info['format_time'] += time.time() - t_start
+        yield page_form
+        offset += len(page)
+
+
+def format_semschol_data(num_papers, results, max_workers=MAX_WORKERS):
     
     '''
     Function for extracting and formatting the results of a Semantic Scholar search query
     Input:  num_papers (int)   --> number of papers
             results (dict)     --> dictionary containing the Semantic Scholar results
+            max_workers (int)  --> number of concurrent workers for resolving BibTex entries
     Output: output_list (list) --> list for Excel dump
     '''
     
     num_authors = None
     output_list = []
-    entries_dict = {}
+    entries_dict = PubRecord()
+    dois = []
+    cache_stats = bib_cache_stats()
 
-    for i in tqdm(range(num_papers)):
+    for i in range(num_papers):
         try:
             entries_dict['Title'] = results['data'][i]['title']
         except:
@@ -187,13 +218,14 @@ def format_semschol_data(num_papers, results):
         except:
             entries_dict['Year'] = None
 
+        # BibTex entries are resolved for the whole page at once below
         try:
             entries_dict['DOI'] = 'https://doi.org/' + results['data'][i]['externalIds']['DOI']
-            bibtex = doi2bib(results['data'][i]['externalIds']['DOI'])
-            entries_dict['BibTex'] = bibtex
+            dois.append(results['data'][i]['externalIds']['DOI'])
         except:
             entries_dict['DOI'] = None
-            entries_dict['BibTex'] = None
+            dois.append(None)
+        entries_dict['BibTex'] = None
 
         try:
             if results['data'][i]['fieldsOfStudy'] is not None:
@@ -219,28 +251,11 @@ def format_semschol_data(num_papers, results):
             entries_dict['URL'] = None
 
         output_list.append(entries_dict)
-        entries_dict = {}
-
-    return output_list
+        entries_dict = PubRecord()
 
-def doi2bib(doi):
-    
-    '''
-    Function for converting DOI to BibTex with the Crossref REST API
-    Crossref REST API documentation: https://www.crossref.org/documentation/retrieve-metadata/rest-api/
-    Input:  DOI (str)    --> publication Digital Object Identifier
-    Output: bibtex (str) --> publication metadata in BiBTex format
-    '''
-    
-    CROSSREF_URL = "http://api.crossref.org/"
-    bibtex = None
-
-    url = "{}works/{}/transform/application/x-bibtex"
-    url = url.format(CROSSREF_URL, doi)
-    r = requests.get(url)
+    for entries_dict, bibtex in zip(output_list, doi2bib_batch(dois, max_workers=max_workers)):
+        entries_dict['BibTex'] = bibtex
 
-    if r.status_code == 200:
-        bibtex = r.content
-        bibtex = str(bibtex, "utf-8")
+    print_bib_cache_stats(before=cache_stats)
 
-    return bibtex
\ No newline at end of file
+    return output_list
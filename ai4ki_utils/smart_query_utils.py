@@ -1,13 +1,104 @@
-import nltk
 import pprint
-import spacy
 import random
-import requests
-import yake
 
-nltk.download('wordnet')
-from nltk.corpus import stopwords as sw
-from nltk.corpus import wordnet as wn
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from ai4ki_utils.boolean_query import AND, OR, Node, Term, make_term, replace_term_in_string, to_query_string
+from ai4ki_utils.composer_utils import compose_prompt, example_prompt
+from ai4ki_utils.spelling_utils import spelling_translator
+from ai4ki_utils.synonym_utils import stop_words, term_synonyms
+
+
+# spaCy model for POS filtering; only the components needed for POS tags and lemmas are loaded
+SPACY_MODEL = 'en_core_web_sm'
+SPACY_EXCLUDE = ['parser', 'ner', 'senter']
+
+
+# The NLP libraries are imported and their models loaded on first use, so importing this module is fast
+@lru_cache(maxsize=None)
+def _nlp():
+
+    import spacy
+    return spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+
+
+@lru_cache(maxsize=None)
+def _extractor(language, ngram_limit, dedup_value, num_keywords):
+
+    import yake
+    return yake.KeywordExtractor(lan=language, n=ngram_limit, dedupLim=dedup_value, top=num_keywords, features=None)
+
+
+def _extract_keywords(args):
+
+    # Worker for keyword extraction (a module-level function, so that it can run in a process pool)
+    text, language, ngram_limit, dedup_value, num_keywords = args
+    return _extractor(language, ngram_limit, dedup_value, num_keywords).extract_keywords(text)
+
+
+def _relevant_keywords(keyword_lists, n_process=1):
+
+    # Delete irrelevant keywords based on POS (the single-word keywords of all lists are tagged in one batch)
+    single = [t[0] for keywords in keyword_lists for t in keywords if len(t[0].split()) == 1]
+    docs = iter(_nlp().pipe(single, n_process=n_process))
+
+    rel_lists = []
+    for keywords in keyword_lists:
+        rel_keywords = []
+        for t in keywords:
+            term = t[0]
+            if len(term.split()) == 1:
+                doc = next(docs)
+                term_pos = doc[0].pos_
+                term_lemma = doc[0].lemma_
+                if term_pos == "PROPN" or term_pos == "NOUN" or term_pos =="VERB":
+                    rel_keywords.append((term_lemma,t[1]))
+            else:
+                rel_keywords.append(t)
+        rel_lists.append(rel_keywords)
+
+    return rel_lists
+
+
+def keyword_query(keywords, top_k):
+
+    '''
+    Function for building the query tree of a keyword search string: (top k keywords AND-chained) AND (other
+    keywords OR-chained); keywords of more than one word are searched as phrases
+    Input:  keywords (list)     --> list of keyword tuples (term, relevance)
+            top_k (int)         --> top k keywords for the search string (to be AND-chained)
+    Output: root (Node)         --> root of the query tree (None, if there are fewer keywords than top_k)
+    '''
+
+    terms = [Term(t[0].lower(), len(t[0].split()) > 1) for t in keywords]
+    if top_k == len(terms):
+        return Node(AND, tuple(terms))
+    if top_k < len(terms):
+        groups = (Node(AND, tuple(terms[:top_k])), Node(OR, tuple(terms[top_k:])))
+        return Node(AND, tuple(g for g in groups if g.children))
+
+    return None
+
+
+def _build_query(keywords, top_k, verbose=True):
+
+    # Construct Boolean search string from keywords
+    qs = ''
+    root = keyword_query(keywords, top_k)
+    if root is not None:
+        qs = to_query_string(root)
+    elif verbose:
+        print('ERROR: Number of extracted keywords smaller than value for top_k --> adjust your parameters!')
+            
+    if qs and verbose:
+        print('THESE ARE YOUR RANKED KEYWORDS:')
+        pp = pprint.PrettyPrinter()
+        pp.pprint(keywords)
+        print('\nTHIS IS YOUR SEARCH STRING:')
+        print(qs)
+
+    return qs
 
 
 def query_constructor(text, org_kw=False, language='en', num_keywords=10, top_k=3, ngram_limit=2, dedup_value=0.5):
@@ -25,74 +116,64 @@ def query_constructor(text, org_kw=False, language='en', num_keywords=10, top_k=
             keywords (list)     --> list of keyword tuples (term, relevance)
     '''
 
-    # Create keyword extractor object
-    extractor = yake.KeywordExtractor(lan=language, n=ngram_limit, dedupLim=dedup_value, top=num_keywords, features=None)
-    
     # Extract keywords from input text 
-    all_keywords = extractor.extract_keywords(text)
-
-    # Delete irrelevant keywords based on POS
-    nlp = spacy.load("en_core_web_sm")
-    rel_keywords = []
-    for t in all_keywords:
-        term = t[0]
-        if len(term.split()) == 1:
-            doc = nlp(term)
-            term_pos = doc[0].pos_
-            term_lemma = doc[0].lemma_
-            if term_pos == "PROPN" or term_pos == "NOUN" or term_pos =="VERB":
-                rel_keywords.append((term_lemma,t[1]))
-        else:
-            rel_keywords.append(t)
-    
+    all_keywords = _extract_keywords((text, language, ngram_limit, dedup_value, num_keywords))
+
     # Choose which keywords to use for search string construction
     if org_kw:
         keywords = all_keywords
     else:
-        keywords = rel_keywords
+        keywords = _relevant_keywords([all_keywords])[0]
     
-    # Constrcut Boolean search string from keywords
-    qs = ''
-    t_count = 0
-    if top_k < len(keywords):
-        qs = '('
-        for t in keywords:
-            t_count +=1
-            term = t[0].lower()
-            if len(term.split()) > 1:
-                term = '\"' + t[0].lower() + '\"'
-            if t_count < top_k: 
-                qs += term + ' AND '
-            elif t_count == top_k:
-                qs += term + ') AND ('
-            elif t_count > top_k and t_count != len(keywords):
-                qs += term + ' OR '
-            elif t_count == len(keywords):
-                qs += term + ')'
-    elif top_k == len(keywords):
-        qs = ''
-        for t in keywords:
-            t_count +=1
-            term = t[0].lower()
-            if len(term.split()) > 1:
-                term = '\"' + t[0].lower() + '\"'
-            if t_count < top_k: 
-                qs += term + ' AND '
-            elif t_count == top_k:
-                qs += term    
-    else:
-        print('ERROR: Number of extracted keywords smaller than value for top_k --> adjust your parameters!')
-            
-    if qs:
-        print('THESE ARE YOUR RANKED KEYWORDS:')
-        pp = pprint.PrettyPrinter()
-        pp.pprint(keywords)
-        print('\nTHIS IS YOUR SEARCH STRING:')
-        print(qs)
+    qs = _build_query(keywords, top_k)
     
     return qs, keywords
 
 
+def query_constructor_batch(texts, org_kw=False, language='en', num_keywords=10, top_k=3, ngram_limit=2,
+                            dedup_value=0.5, n_process=1, verbose=False):
+    
+    '''
+    Function for constructing Boolean search strings from many input texts (e.g. abstracts) at once; the keyword
+    extractor and the spaCy model are set up only once and the keywords of all texts are POS-tagged in one batch
+    Input:  texts (iterable)    --> texts from which to extract the keywords
+            org_kw (Boolean)    --> use all keywords or only proper nouns, nouns and verbs (True/False)
+            language (str)      --> language of the input texts
+            num_keywords (int)  --> maximum number of keywords to extract per text
+            top_k (int)         --> top k keywords for each search string (to be AND-chained)
+            ngram_limit (int)   --> maximum keyword length
+            dedup_value (float) --> parameter to control duplication of words in different keywords
+            n_process (int)     --> number of processes for keyword extraction and POS tagging
+            verbose (Boolean)   --> print keywords and search string of each text
+    Output: queries (list)      --> constructed Boolean search string for each text ('' if there were too few keywords)
+            keywords (list)     --> list of keyword tuples (term, relevance) for each text
+    '''
+
+    args = [(text, language, ngram_limit, dedup_value, num_keywords) for text in texts]
+
+    # Extract keywords from all texts (YAKE runs in pure Python, so several processes are used for multi-core)
+    if n_process > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=n_process) as pool:
+            all_keywords = list(pool.map(_extract_keywords, args, chunksize=max(1, len(args) // (4*n_process))))
+    else:
+        all_keywords = [_extract_keywords(a) for a in args]
+
+    # Choose which keywords to use for search string construction
+    if org_kw:
+        keywords = all_keywords
+    else:
+        keywords = _relevant_keywords(all_keywords, n_process=n_process)
+
+    queries = [_build_query(k, top_k, verbose=verbose) for k in keywords]
+
+    n_failed = queries.count('')
+    if n_failed:
+        print('ERROR: Number of extracted keywords smaller than value for top_k for {} of {} texts --> '
+              'adjust your parameters!'.format(n_failed, len(queries)))
+
+    return queries, keywords
+
+
 def query_synonymizer(search_string, term=""):
      
     '''
@@ -107,64 +188,70 @@ def query_synonymizer(search_string, term=""):
     term = term.lower()
     syn_string = search_string
     
-    # Find synonyms for term using wordnet
-    syns_tmp = []
-    for syn in wn.synsets(term):
-        for lem in syn.lemmas():
-            syns_tmp.append(lem.name())
-    
-    # Eliminate synonyms appearing more than once
-    synonyms = list(set(syns_tmp))
+    # Find synonyms for term using wordnet (without duplicates)
+    synonyms = list(term_synonyms(term))
     num_syns = len(synonyms)
     
-    # Replace term with OR-chained synonyms
+    # Replace the term (wherever it is a whole search term of the query) with OR-chained synonyms
     if num_syns > 1:
-        if term in synonyms:
-            new_term = '('
+        syn_terms = [make_term(s) for s in synonyms]
+        if term not in synonyms:
+            syn_terms.insert(0, make_term(term))
+        new_string, n_replaced = replace_term_in_string(search_string, term, Node(OR, tuple(syn_terms)))
+        if n_replaced:
+            syn_string = new_string
         else:
-            new_term = '(' + term + ' OR '
-        
-        for i in range(num_syns-1): 
-            new_term += synonyms[i] + ' OR '
-            
-        new_term += synonyms[-1] + ')'
-        syn_string = syn_string.replace(term,new_term)
+            print(f'Sorry, \"{term}\" is only part of a search term')
     else:
         print(f'Sorry, no synonyms found for \"{term}\"') 
         
     return syn_string
     
 
-def query_composer(text, maxq_length=20, temperature=0.9):
+def query_composer(tokenizer, generator, text, maxq_length=20, temperature=0.9):
     
     '''
-    Function to create Boolean search stroing from an input text using GPT-2
+    Function to create Boolean search string from an input text using GPT-2 (for many texts, use
+    composer_utils.QueryComposer, which generates the search strings of a batch of texts at once)
     Input:  tokenizer           --> GPT-2 tokenizer object
-            generator           --> GPT-2 model instance
+            generator           --> GPT-2 text-generation pipeline
             text (str)          --> input text
             maxq_length (int)   --> maximum number of tokens for GPT-2 output 
             temperature (float) --> GPT-2 parameter for controlling output randomness
     Output: generated search string
     '''
     
-    with open('qs_example_b.txt', 'r', encoding='utf-8') as f: example = f.read()
-    
-    prompt = f"{example}\n\nText: {text}\nSearch string:" 
+    # The examples are read only once
+    prompt = compose_prompt(example_prompt(), text)
 
-    n_tokens = len(tokenizer(prompt)['input_ids'])
-    max_tokens = n_tokens + maxq_length 
     queries = generator(prompt,
-                        max_length=max_tokens,
+                        max_new_tokens=maxq_length,
+                        do_sample=True,
                         temperature=temperature,
                         top_p=1.0,
                         return_full_text=False,
                         num_return_sequences=1,
-                        repetition_penalty=1.0
+                        repetition_penalty=1.0,
+                        pad_token_id=tokenizer.eos_token_id
                         )
 
     return queries[0]['generated_text']
 
     
+def _query_tokens(query, stop_set):
+
+    # Tokenize query (the simple way...): (word, True) for words to find synonyms for, (word, False) for stopwords
+    # and words marked with '!', which are kept as they are
+    tokens = []
+    for w in query.lower().split():
+        if '!' in w:
+            tokens.append((w.replace('!', '').replace('&', ' '), False))
+        else:
+            tokens.append((w, w not in stop_set))
+
+    return tokens
+
+
 def find_synonyms(query):
     
     '''
@@ -172,52 +259,43 @@ def find_synonyms(query):
     Input:  query (str)  --> some string
     Output: q_alt (list) --> list with synonyms for each non-stopword in 'query'
     '''
+
+    return find_synonyms_batch([query])[0]
+
+
+def find_synonyms_batch(queries):
     
-    q = query.lower()
-    stop_words = set(sw.words('english'))
+    '''
+    Function for finding synonyms for every non-stopword in each of several queries; the distinct words of all
+    queries are looked up only once
+    Input:  queries (list)  --> list of strings
+    Output: q_alts (list)   --> list with the output of find_synonyms for each query
+    '''
 
-    # Tokenize query (the simple way...)
-    q_tokens = q.split()
+    stop_set = stop_words('english')
+    q_tokens = [_query_tokens(q, stop_set) for q in queries]
 
-    # Find synonyms for each query token
-    q_syns = []
-    for w in q_tokens:
-        if not '!' in w:
-            if not w in stop_words:
-                synonyms = [w]
-                for syn in wn.synsets(w):
-                    for lem in syn.lemmas():
-                        synonyms.append(lem.name())
-                q_syns.append(list(set(synonyms)))
-            else:
-                q_syns.append(w)
-        else:
-            w = w.replace('!', '')
-            w = w.replace('&', ' ')
-            q_syns.append(w)
+    # Find synonyms for each distinct word (lookups are memoized, see synonym_utils)
+    words = dict.fromkeys(w for tokens in q_tokens for w, lookup in tokens if lookup)
+    syns = {w: list(dict.fromkeys((w,) + term_synonyms(w))) for w in words}
 
-    return q_syns
+    return [[list(syns[w]) if lookup else w for w, lookup in tokens] for tokens in q_tokens]
 
 
 def us_vs_uk_en(query, direction):
     
     '''
-    Function for translating a query from Amerivan to British English an vice versa
-    Input:  query (str)     --> some string
-            direction (str) --> direction of translation: us2uk or uk2us
-    Output: query (str)     --> translated string
+    Function for translating a query from American to British English and vice versa
+    Input:  query (str/list)     --> some string (or a list of strings, which are translated at once)
+            direction (str)      --> direction of translation: us2uk or uk2us
+    Output: query (str/list)     --> translated string (or list of translated strings)
     '''
-    
-    url ="https://raw.githubusercontent.com/hyperreality/American-British-English-Translator/master/data/british_spellings.json"
-    british_to_american_dict = requests.get(url).json()    
 
-    for british_spelling, american_spelling in british_to_american_dict.items():
-        if direction == "uk2us":
-            query = query.replace(british_spelling, american_spelling)
-        elif direction == "us2uk":
-            query = query.replace(american_spelling, british_spelling)
+    translator = spelling_translator(direction)
+    if isinstance(query, str):
+        return translator.translate(query)
 
-    return query
+    return translator.translate_batch(query)
 
 
 def rand_query(query_syns):
@@ -0,0 +1,120 @@
+import json
+import os
+import re
+
+from functools import lru_cache
+from os.path import exists, join
+
+from ai4ki_utils import http_client
+from ai4ki_utils.cache_utils import CACHE_DIR
+from ai4ki_utils.keyword_matcher import trie_pattern
+
+
+# British -> American spelling dictionary; it's downloaded once and then read from the cache directory
+SPELLINGS_URL = ('https://raw.githubusercontent.com/hyperreality/American-British-English-Translator/master/data/'
+                 'british_spellings.json')
+SPELLINGS_FILE = join(CACHE_DIR, 'british_spellings.json')
+
+DIRECTIONS = ('uk2us', 'us2uk')
+
+
+@lru_cache(maxsize=None)
+def british_spellings(path=SPELLINGS_FILE):
+
+    '''
+    Load the British -> American spelling dictionary (downloaded on first use and stored in 'path')
+    Input:  path (str)          --> path of the local copy of the dictionary
+    Output: spellings (dict)    --> dictionary with British spellings as keys and American spellings as values
+    '''
+
+    if not exists(path):
+        r = http_client.get(SPELLINGS_URL)
+        r.raise_for_status()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(r.text)
+        os.replace(tmp_path, path)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _match_case(word, translation):
+
+    # Transfer the capitalization of the original word (lower case, capitalized or all caps) to its translation
+    if word.islower():
+        return translation
+    if word.isupper() and len(word) > 1:
+        return translation.upper()
+    if word[0].isupper():
+        return translation[0].upper() + translation[1:]
+    return translation
+
+
+class SpellingTranslator:
+
+    '''
+    Translator between British and American spellings: all dictionary words are compiled into a single regex, so a
+    query is translated in one pass; only whole words are replaced and their capitalization is kept
+    Input:  direction (str)     --> direction of translation: us2uk or uk2us
+            spellings (dict)    --> British -> American spelling dictionary (None = british_spellings())
+    '''
+
+    def __init__(self, direction, spellings=None):
+
+        if direction not in DIRECTIONS:
+            raise ValueError('Unknown direction {!r} (use us2uk or uk2us)'.format(direction))
+        if spellings is None:
+            spellings = british_spellings()
+
+        self.direction = direction
+        if direction == 'uk2us':
+            self.table = {uk.lower(): us for uk, us in spellings.items()}
+        else:
+            # Several British spellings can map to the same American one; the first one is used
+            self.table = {}
+            for uk, us in spellings.items():
+                self.table.setdefault(us.lower(), uk)
+
+        body = trie_pattern(self.table)
+        self.regex = re.compile(r'(?<!\w)' + body + r'(?!\w)', re.IGNORECASE) if body else None
+
+    def _replace(self, m):
+
+        word = m.group(0)
+        return _match_case(word, self.table[word.lower()])
+
+    def translate(self, query):
+
+        '''
+        Translate one query
+        Input:  query (str) --> some string
+        Output: query (str) --> translated string
+        '''
+
+        if self.regex is None:
+            return query
+        return self.regex.sub(self._replace, query)
+
+    def translate_batch(self, queries):
+
+        '''
+        Translate a list of queries
+        Input:  queries (list) --> list of strings
+        Output: queries (list) --> list of translated strings
+        '''
+
+        return [self.translate(q) for q in queries]
+
+
+@lru_cache(maxsize=None)
+def spelling_translator(direction):
+
+    '''
+    Shared translator for one direction (the dictionary is loaded and the regex compiled only once)
+    Input:  direction (str)                 --> direction of translation: us2uk or uk2us
+    Output: translator (SpellingTranslator) --> translator object
+    '''
+
+    return SpellingTranslator(direction)
@@ -0,0 +1,166 @@
+import json
+import os
+
+from functools import lru_cache
+from os.path import join
+
+from ai4ki_utils.cache_utils import CACHE_DIR
+
+
+# NLTK resources (only downloaded, if they aren't installed yet)
+NLTK_RESOURCES = {'wordnet': 'corpora/wordnet', 'stopwords': 'corpora/stopwords'}
+
+# Default location of the precomputed synonym lexicon (see build_lexicon)
+LEXICON_FILE = join(CACHE_DIR, 'synonym_lexicon.json')
+SYNONYM_CACHE_SIZE = 100000
+
+# Rules for reducing inflected words to lemmas (WordNet's morphy rules for nouns, verbs and adjectives)
+INFLECTION_RULES = (('s', ''), ('ses', 's'), ('ves', 'f'), ('xes', 'x'), ('zes', 'z'), ('ches', 'ch'), ('shes', 'sh'),
+                    ('men', 'man'), ('ies', 'y'), ('es', 'e'), ('es', ''), ('ed', 'e'), ('ed', ''), ('ing', 'e'),
+                    ('ing', ''), ('er', ''), ('est', ''), ('er', 'e'), ('est', 'e'))
+
+# Lexicon used instead of WordNet, once it is loaded with load_lexicon
+_lexicon = {'terms': None, 'forms': None, 'fallback': False}
+
+
+# NLTK is imported and its corpora loaded on first use
+def _ensure_nltk(resource):
+
+    import nltk
+
+    try:
+        nltk.data.find(NLTK_RESOURCES[resource])
+    except LookupError:
+        nltk.download(resource, quiet=True)
+
+
+@lru_cache(maxsize=None)
+def _wordnet():
+
+    _ensure_nltk('wordnet')
+    from nltk.corpus import wordnet as wn
+    return wn
+
+
+@lru_cache(maxsize=None)
+def stop_words(language='english'):
+
+    '''
+    Stopword set of a language (created only once)
+    Input:  language (str)      --> language of the NLTK stopword list
+    Output: stop_words (set)    --> set with stopwords
+    '''
+
+    _ensure_nltk('stopwords')
+    from nltk.corpus import stopwords as sw
+    return frozenset(sw.words(language))
+
+
+def _wordnet_synonyms(term):
+
+    # Lemma names of all synsets of the term (without duplicates, in the order WordNet returns them)
+    synonyms = {}
+    for syn in _wordnet().synsets(term):
+        for lem in syn.lemmas():
+            synonyms[lem.name()] = None
+
+    return tuple(synonyms)
+
+
+def _wordnet_forms():
+
+    # Irregular inflections of WordNet lemmas (e.g. 'geese' -> 'goose') from WordNet's exception lists
+    forms = {}
+    for pos in ('noun', 'verb', 'adj', 'adv'):
+        for line in _wordnet().open(pos + '.exc'):
+            words = line.split()
+            if len(words) > 1:
+                forms.setdefault(words[0], {}).update(dict.fromkeys(words[1:]))
+
+    return {form: list(lemmas) for form, lemmas in forms.items()}
+
+
+def _lemmas(term, terms, forms):
+
+    # Lemmas of an inflected term that are in the lexicon (as WordNet's morphy finds them for a synset lookup)
+    lemmas = dict.fromkeys(forms.get(term, ()))
+    for suffix, ending in INFLECTION_RULES:
+        if term.endswith(suffix) and len(term) > len(suffix):
+            lemmas[term[:-len(suffix)] + ending] = None
+
+    return [lemma for lemma in lemmas if lemma in terms]
+
+
+@lru_cache(maxsize=SYNONYM_CACHE_SIZE)
+def term_synonyms(term):
+
+    '''
+    Synonyms of a term from the loaded lexicon or from WordNet (results are memoized); inflected terms that aren't
+    in the lexicon are looked up by their lemmas (e.g. 'farms' by 'farm'), as WordNet does
+    Input:  term (str)          --> single word
+    Output: synonyms (tuple)    --> WordNet lemma names of the term (may include the term itself)
+    '''
+
+    lexicon = _lexicon['terms']
+    if lexicon is not None:
+        if term in lexicon:
+            return tuple(lexicon[term])
+        lemmas = _lemmas(term, lexicon, _lexicon['forms'])
+        if lemmas:
+            return tuple(dict.fromkeys(syn for lemma in lemmas for syn in lexicon[lemma]))
+        if not _lexicon['fallback']:
+            return ()
+
+    return _wordnet_synonyms(term)
+
+
+def build_lexicon(terms=None, path=LEXICON_FILE):
+
+    '''
+    Precompute the synonyms of many terms and store them as a JSON lexicon (together with WordNet's irregular
+    inflections, so that inflected terms can be looked up by their lemmas)
+    Input:  terms (list)    --> terms to include (None = all lemma names in WordNet)
+            path (str)      --> path of the lexicon file
+    Output: n_terms (int)   --> number of terms with synonyms in the lexicon
+    '''
+
+    if terms is None:
+        terms = _wordnet().all_lemma_names()
+
+    lexicon = {}
+    for term in terms:
+        synonyms = _wordnet_synonyms(term)
+        if synonyms:
+            lexicon[term] = synonyms
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'terms': lexicon, 'forms': _wordnet_forms()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+    return len(lexicon)
+
+
+def load_lexicon(path=LEXICON_FILE, fallback=False):
+
+    '''
+    Use a lexicon created by build_lexicon instead of WordNet for all synonym lookups
+    Input:  path (str)          --> path of the lexicon file (None = stop using a lexicon)
+            fallback (bool)     --> look up terms that aren't in the lexicon in WordNet (False = no synonyms)
+    Output: n_terms (int)       --> number of terms in the lexicon
+    '''
+
+    if path is None:
+        lexicon, forms = None, None
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        lexicon, forms = data['terms'], data['forms']
+
+    _lexicon['terms'] = lexicon
+    _lexicon['forms'] = forms
+    _lexicon['fallback'] = fallback
+    term_synonyms.cache_clear()
+
+    return 0 if lexicon is None else len(lexicon)